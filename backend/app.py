@@ -1,23 +1,77 @@
 import os
+
+# Size the OpenMP / MKL pools before numpy and torch load them (half the
+# cores by default; configure_torch sets torch's own pools at startup)
+_DEFAULT_THREADS = str(max(1, (os.cpu_count() or 2) // 2))
+os.environ.setdefault('OMP_NUM_THREADS', _DEFAULT_THREADS)
+os.environ.setdefault('MKL_NUM_THREADS', os.environ['OMP_NUM_THREADS'])
+
+import time
+import queue
 import base64
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from io import BytesIO
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
 from werkzeug.utils import secure_filename
+import numpy as np
+import orjson
 from PIL import Image
-import uuid
-from datetime import datetime
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.targets import ValueTarget
+
+# Optional fast decoders (fall back to Pillow when unavailable)
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbojpeg = TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    _turbojpeg = None
+
+try:
+    import imagecodecs
+except ImportError:
+    imagecodecs = None
 
-from src import get_model
-from src.preprocessing import preprocess_pipeline_custom
-from src.realesrgan_inference import get_realesrgan_model
-from src.degradation import degrade_for_evaluation
+from cleanup_storage import remove_old_files
+
+# The model / image processing modules (torch, basicsr, cv2) are imported
+# lazily where they are used to keep importing this module cheap
 
 # Configuration
 UPLOAD_FOLDER = 'storage/uploads'
 OUTPUT_FOLDER = 'storage/outputs'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'tiff'}
+_ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in ALLOWED_EXTENSIONS)
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes fed to the multipart parser per read
+RESPONSE_JPEG_QUALITY = 90  # Quality of the JPEG images returned to the browser
+DEVICE = 'cuda'  # Device both SR models run on
+MODEL_DTYPE = 'fp16' if DEVICE == 'cuda' else 'bf16'  # CPU bf16 falls back to fp32 without native support
+MAX_INPUT_PIXELS = 1024 * 1024  # Larger inputs are downscaled before SR
+SAVE_UPLOADS = os.environ.get('SAVE_UPLOADS', '0') == '1'  # Keep uploads on disk for debugging
+# Real-ESRGAN tile size (0 = whole image, e.g. 512 on small GPUs); on CPU
+# cache-sized tiles (each run with torch's intra-op threads)
+REALESRGAN_TILE = 0 if DEVICE == 'cuda' else 256
+EDSR_TILE = 512  # EDSR tile size (0 = whole image); bounds memory on 4x Real-ESRGAN outputs
+EDSR_MAX_BATCH = 4  # Concurrent same-sized EDSR requests run as one batch
+REALESRGAN_MAX_BATCH = 4  # Same for Real-ESRGAN (untiled only)
+IMAGE_CACHE_MAX_AGE = 365 * 24 * 3600  # 1 year, stored images are never modified
+
+# Form fields accepted alongside the 'image' upload
+FORM_FIELDS = (
+    'calculate_metrics',
+    'enable_preprocess',
+    'enable_deblur',
+    'enable_edsr',
+    'enable_face_enhance',
+    'evaluation_mode',
+    'enable_blur_noise',
+    'enable_downscale',
+)
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -25,31 +79,402 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
-# Enable CORS for frontend
-CORS(app)
+# Metric headers sent with binary /api/denoise responses
+METRIC_HEADERS = {
+    'psnr': 'X-PSNR',
+    'ssim': 'X-SSIM',
+    'niqe': 'X-NIQE',
+    'lpips': 'X-LPIPS',
+}
+
+# Enable CORS for frontend (expose the binary response headers to the browser)
+CORS(app, expose_headers=[
+    'X-Input-Size', 'X-Output-Size', 'X-Processing-Time', *METRIC_HEADERS.values()
+])
 
 # Ensure storage folders exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Load EDSR model (lazy loading)
+# Reusable BytesIO buffers for response encoding (one per concurrent encode)
+_BUFFER_POOL = queue.LifoQueue(maxsize=8)
+
+# Background encoding of pipeline stage outputs (overlaps with the next stage)
+_ENCODE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='encode')
+
+# Background disk writes of uploads (only used with SAVE_UPLOADS)
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='io')
+
+# Load models (initialized once at startup, see warmup_models)
 model = None
+deblur_model = None
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+def form_flag(form, name, default):
+    """Read a 'true'/'false' form field as a bool"""
+    return form.get(name, 'true' if default else 'false').lower() == 'true'
+
+def _acquire_buffer():
+    """Take an encode buffer from the pool (or create one)"""
+    try:
+        buffered = _BUFFER_POOL.get_nowait()
+    except queue.Empty:
+        buffered = BytesIO()
+    buffered.seek(0)
+    return buffered
+
+def _release_buffer(buffered):
+    """Return an encode buffer to the pool"""
+    try:
+        _BUFFER_POOL.put_nowait(buffered)
+    except queue.Full:
+        pass
+
+def _save_jpeg(img, buffered):
+    """
+    Encode a PIL Image as JPEG into a pooled buffer
+
+    JPEG encoding is several times faster than PNG (single-threaded zlib)
+    on 4x upscaled outputs, and lossless output is not needed for display.
+    The buffer is overwritten from the start without truncating, so its
+    allocation is reused; only the first returned byte count is valid.
+    """
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    img.save(buffered, format='JPEG', quality=RESPONSE_JPEG_QUALITY)
+    return buffered.tell()
+
+def encode_jpeg(img):
+    """Encode a PIL Image as JPEG bytes for the response"""
+    buffered = _acquire_buffer()
+    try:
+        size = _save_jpeg(img, buffered)
+        with buffered.getbuffer() as view:
+            return bytes(view[:size])
+    finally:
+        _release_buffer(buffered)
+
+def image_to_data_url(img):
+    """Encode a PIL Image as a base64 JPEG data URL for the JSON response"""
+    if img is None:
+        return None
+    buffered = _acquire_buffer()
+    try:
+        size = _save_jpeg(img, buffered)
+        with buffered.getbuffer() as view, view[:size] as data:
+            return f'data:image/jpeg;base64,{base64.b64encode(data).decode("ascii")}'
+    finally:
+        _release_buffer(buffered)
+
+def json_response(data):
+    """
+    Serialize a response carrying image payloads with orjson
+
+    Faster than jsonify for bodies dominated by multi-MB base64 strings.
+    Small responses (errors, health check) keep using jsonify.
+    """
+    return Response(
+        orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY),
+        mimetype='application/json'
+    )
+
+# Placeholder for the streamed image in streaming_json_response
+_STREAMED_IMAGE = '__streamed_image_data__'
+# Raw bytes per base64 chunk (multiple of 3, so chunks concatenate cleanly)
+_BASE64_CHUNK = 3 * 64 * 1024
+
+def streaming_json_response(data, jpeg_bytes):
+    """
+    Stream a JSON response whose image data URL is base64-encoded chunk-wise
+
+    data must contain _STREAMED_IMAGE once, where the data URL goes. Only
+    the JPEG bytes are held in memory; the full base64 string and the
+    serialized JSON body containing it are never built.
+    """
+    body = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    head, tail = body.split(orjson.dumps(_STREAMED_IMAGE), 1)
+
+    def generate():
+        yield head + b'"data:image/jpeg;base64,'
+        for start in range(0, len(jpeg_bytes), _BASE64_CHUNK):
+            yield base64.b64encode(jpeg_bytes[start:start + _BASE64_CHUNK])
+        yield b'"' + tail
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def parse_upload(req):
+    """
+    Parse a multipart upload with streaming-form-data
+
+    Werkzeug's built-in multipart parser is CPU-bound on multi-MB bodies,
+    so the request stream is fed to a StreamingFormDataParser instead.
+
+    Returns:
+        Dict with 'filename' (None if no image part was sent), 'data'
+        (raw image bytes) and 'form' (field name -> string value)
+    """
+    if not (req.content_type or '').startswith('multipart/form-data'):
+        return {'filename': None, 'data': b'', 'form': {}}
+
+    parser = StreamingFormDataParser(headers=req.headers)
+
+    image_target = ValueTarget()
+    parser.register('image', image_target)
+
+    field_targets = {}
+    for name in FORM_FIELDS:
+        field_targets[name] = ValueTarget()
+        parser.register(name, field_targets[name])
+
+    while chunk := req.stream.read(UPLOAD_CHUNK_SIZE):
+        parser.data_received(chunk)
+
+    return {
+        'filename': image_target.multipart_filename,
+        'data': image_target.value,
+        'form': {
+            name: target.value.decode('utf-8')
+            for name, target in field_targets.items()
+            if target.value
+        }
+    }
+
+def decode_image_array(data, filename):
+    """
+    Decode upload bytes straight to an RGB uint8 numpy array
+
+    The format is taken from the magic bytes, not the file extension. JPEGs
+    go through libjpeg-turbo's raw API and 8-bit PNGs through imagecodecs
+    when those packages are installed; anything else, and anything those
+    decoders reject (e.g. CMYK JPEGs), falls back to Pillow.
+
+    Returns:
+        Numpy array (H, W, 3) in RGB order
+    """
+    try:
+        if data.startswith(b'\xff\xd8\xff') and _turbojpeg is not None:
+            return _turbojpeg.decode(data, pixel_format=TJPF_RGB)
+
+        if data.startswith(b'\x89PNG\r\n\x1a\n') and imagecodecs is not None:
+            arr = imagecodecs.png_decode(data)
+            if arr.dtype == np.uint8:
+                if arr.ndim == 2:
+                    return np.repeat(arr[:, :, None], 3, axis=2)
+                if arr.shape[2] == 3:
+                    return arr
+                if arr.shape[2] == 4:
+                    return np.ascontiguousarray(arr[:, :, :3])
+    except Exception as e:
+        print(f"[WARN] Fast decode of {filename} failed, using Pillow: {e}")
+
+    with Image.open(BytesIO(data)) as img:
+        return np.asarray(img.convert('RGB'))
+
+def limit_input_size(img):
+    """
+    Downscale a PIL Image to at most MAX_INPUT_PIXELS pixels
+
+    Bounds the worst-case SR cost (and output size) for large uploads.
+    """
+    width, height = img.size
+    if width * height <= MAX_INPUT_PIXELS:
+        return img
+
+    scale = (MAX_INPUT_PIXELS / (width * height)) ** 0.5
+    new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    print(f"Downscaling input from {img.size} to {new_size}")
+    return img.resize(new_size, Image.LANCZOS)
+
+def _write_upload(path, data):
+    """Write raw upload bytes to disk (runs on _IO_EXECUTOR)"""
+    try:
+        with open(path, 'wb') as f:
+            f.write(data)
+    except OSError as e:
+        print(f"[WARN] Failed to save upload {path}: {e}")
+
+def image_upload(view=None, *, as_array=False):
+    """
+    Decorator for endpoints taking an 'image' upload
+
+    Parses and validates the multipart body, decodes the image in memory
+    and calls the view as view(filename, image, form). Validation errors
+    are answered with 400 before the view runs.
+
+    With as_array=True the image is passed as an RGB uint8 numpy array
+    (see decode_image_array) instead of a PIL Image. Images larger than
+    MAX_INPUT_PIXELS are downscaled (see limit_input_size).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                upload = parse_upload(request)
+            except Exception as e:
+                # Malformed / truncated multipart body or non-UTF-8 form
+                # field: answered like a missing image, as Werkzeug's parser did
+                print(f"[WARN] Failed to parse upload: {e}")
+                return jsonify({'error': 'No image file provided'}), 400
+            filename = upload['filename']
+
+            # Check if file is present
+            if filename is None:
+                return jsonify({'error': 'No image file provided'}), 400
+
+            # Check if file is selected
+            if filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+
+            # Validate file type
+            if not allowed_file(filename):
+                return jsonify({
+                    'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'
+                }), 400
+
+            # Decode the upload from memory (no round-trip through UPLOAD_FOLDER)
+            try:
+                if as_array:
+                    image = decode_image_array(upload['data'], filename)
+                    if image.shape[0] * image.shape[1] > MAX_INPUT_PIXELS:
+                        image = np.asarray(limit_input_size(Image.fromarray(image)))
+                else:
+                    image = Image.open(BytesIO(upload['data']))
+                    image.load()
+                    image = limit_input_size(image)
+            except Exception as e:
+                return jsonify({'error': 'Invalid image file', 'details': str(e)}), 400
+
+            # Content hash of the raw upload (cache key for results)
+            g.upload_digest = hashlib.blake2b(upload['data'], digest_size=16).hexdigest()
+
+            # Optionally keep the upload; written off the request path
+            if SAVE_UPLOADS:
+                file_ext = filename.rsplit('.', 1)[1].lower()
+                input_path = os.path.join(
+                    app.config['UPLOAD_FOLDER'], f'{g.upload_digest}_input.{file_ext}'
+                )
+                _IO_EXECUTOR.submit(_write_upload, input_path, upload['data'])
+
+            return view(filename, image, upload['form'], *args, **kwargs)
+
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+def _cache_path(digest):
+    """Path of the cached EDSR result for an upload digest"""
+    return os.path.join(app.config['OUTPUT_FOLDER'], f'{digest}_edsr.png')
+
+def load_cached_result(digest):
+    """Load a cached EDSR result (PIL Image), or None on a cache miss"""
+    path = _cache_path(digest)
+    try:
+        with Image.open(path) as img:
+            img.load()
+            return img
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Corrupt or truncated entry: drop it and recompute
+        print(f"[WARN] Discarding unreadable cached result: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+def save_cached_result(digest, img):
+    """Store an EDSR result in the cache (written atomically)"""
+    path = _cache_path(digest)
+    tmp_path = None
+    try:
+        # Unique temp file per writer, so concurrent identical uploads
+        # never write into the same file
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), suffix='.tmp', delete=False
+        ) as tmp_file:
+            tmp_path = tmp_file.name
+            # Lossless, but favor encode speed over file size
+            img.save(tmp_file, format='PNG', compress_level=1)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"[WARN] Failed to cache result: {e}")
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
 def get_edsr_model():
     """Get or initialize EDSR model"""
     global model
     if model is None:
+        from src import get_model
         model_path = os.path.join('models', 'edsr_baseline_x4-6b446fab.pt')
         print("Initializing EDSR model...")
-        model = get_model(model_path=model_path, scale=4, device='cuda')  # Use CPU to avoid OOM
+        model = get_model(
+            model_path=model_path, scale=4, device=DEVICE, dtype=MODEL_DTYPE, tile=EDSR_TILE,
+            max_batch=EDSR_MAX_BATCH
+        )
         print("Model ready!")
     return model
 
+def get_deblur_model():
+    """Get or initialize Real-ESRGAN model"""
+    global deblur_model
+    if deblur_model is None:
+        from src.realesrgan_inference import get_realesrgan_model
+        model_path = os.path.join('models', 'RealESRGAN_x4plus.pth')
+        print("Initializing Real-ESRGAN model...")
+        deblur_model = get_realesrgan_model(
+            model_path=model_path, scale=4, device=DEVICE, dtype=MODEL_DTYPE, tile=REALESRGAN_TILE,
+            max_batch=REALESRGAN_MAX_BATCH
+        )
+        print("Model ready!")
+    return deblur_model
+
+def configure_torch():
+    """
+    Set process-wide torch threading / cuDNN options once at startup
+
+    On the GPU path extra intra-op CPU threads only compete with the request
+    threads, so a single thread is used; on CPU OMP_NUM_THREADS (half the
+    cores by default). TORCH_NUM_THREADS overrides either default.
+    """
+    import torch
+
+    default_threads = 1 if DEVICE == 'cuda' else int(os.environ['OMP_NUM_THREADS'])
+    torch.set_num_threads(int(os.environ.get('TORCH_NUM_THREADS', default_threads)))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already set, or inter-op work has already started
+
+    # Cache the fastest conv algorithm per input shape
+    torch.backends.cudnn.benchmark = True
+
+def warmup_models():
+    """
+    Load both SR models and run one dummy inference each, so checkpoint
+    loading, CUDA context creation and cuDNN algorithm selection happen
+    at startup instead of on the first user request
+    """
+    configure_torch()
+    dummy = Image.new('RGB', (64, 64))
+
+    print("Warming up EDSR model...")
+    get_edsr_model().infer_from_pil(dummy)
+
+    print("Warming up Real-ESRGAN model...")
+    # Runs its own dummy inference on construction
+    get_deblur_model()
+    print("Models warmed up!")
+
 
 @app.route('/')
 def index():
@@ -62,91 +487,75 @@ def index():
 
 
 @app.route('/api/denoise', methods=['POST'])
-def denoise_image():
+@image_upload(as_array=True)
+def denoise_image(filename, input_array, form):
     """
     Process image with EDSR denoising
 
     Expected: multipart/form-data with 'image' file
-    Returns: JSON with processed image URL
+    Returns: JSON with the processed image as a base64 data URL, or with
+             ?format=binary the raw JPEG with sizes/metrics in X-* headers
     """
     try:
-        # Check if file is present
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
-
-        file = request.files['image']
-
-        # Check if file is selected
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-
-        # Validate file type
-        if not allowed_file(file.filename):
-            return jsonify({
-                'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'
-            }), 400
-
-        # Generate unique filename
-        file_ext = file.filename.rsplit('.', 1)[1].lower()
-        unique_id = str(uuid.uuid4())
-        input_filename = f"{unique_id}_input.{file_ext}"
-        output_filename = f"{unique_id}_output.png"
-
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], input_filename)
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-
-        # Save uploaded file
-        file.save(input_path)
-        print(f"Received image: {input_filename}")
+        input_size = (input_array.shape[1], input_array.shape[0])
+        print(f"Received image: {filename}")
 
         # Check if metrics calculation is requested
-        calculate_metrics = request.form.get('calculate_metrics', 'false').lower() == 'true'
+        calculate_metrics = form_flag(form, 'calculate_metrics', False)
 
-        # Run EDSR inference (without saving to file)
-        print("Running EDSR inference...")
-        start_time = datetime.now()
+        start_time = time.perf_counter()
 
-        edsr_model = get_edsr_model()
-        # Use infer method without output_path to avoid saving
-        result = edsr_model.infer(input_path, output_path=None, calculate_metrics=calculate_metrics)
+        # Identical uploads reuse the stored result (metrics need the full run)
+        result_image = None if calculate_metrics else load_cached_result(g.upload_digest)
 
-        if calculate_metrics:
-            result_image, metrics = result
-        else:
-            result_image = result
+        if result_image is not None:
+            print("Using cached EDSR result")
             metrics = None
+        else:
+            print("Running EDSR inference...")
+            edsr_model = get_edsr_model()
+            result = edsr_model.infer_from_array(input_array, output_path=None, calculate_metrics=calculate_metrics)
+
+            if calculate_metrics:
+                result_image, metrics = result
+            else:
+                result_image = result
+                metrics = None
+
+            # Write the cache entry in the background
+            _ENCODE_EXECUTOR.submit(save_cached_result, g.upload_digest, result_image)
 
-        elapsed = (datetime.now() - start_time).total_seconds()
+        elapsed = time.perf_counter() - start_time
         print(f"Processing completed in {elapsed:.2f}s")
 
-        # Get image dimensions (use with statement to ensure file is closed)
-        with Image.open(input_path) as input_img:
-            input_size = input_img.size
         output_size = result_image.size
 
-        # Convert output image to base64 (so we don't need to save it)
-        buffered = BytesIO()
-        result_image.save(buffered, format="PNG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-
-        # Clean up input file immediately (file is now closed)
-        try:
-            os.remove(input_path)
-            print(f"[OK] Cleaned up temporary files (no output file created)")
-        except Exception as cleanup_error:
-            print(f"[WARN] Failed to cleanup {input_path}: {cleanup_error}")
+        # Binary response: skip base64/JSON and send the JPEG bytes directly
+        if request.args.get('format') == 'binary':
+            response = send_file(
+                BytesIO(encode_jpeg(result_image)),
+                mimetype='image/jpeg',
+                download_name='output.jpg'
+            )
+            response.headers['X-Input-Size'] = f"{input_size[0]}x{input_size[1]}"
+            response.headers['X-Output-Size'] = f"{output_size[0]}x{output_size[1]}"
+            response.headers['X-Processing-Time'] = f"{elapsed:.2f}s"
+            for name, value in (metrics or {}).items():
+                if name in METRIC_HEADERS:
+                    response.headers[METRIC_HEADERS[name]] = str(value)
+            return response
 
         # Build response
         response_data = {
             'success': True,
             'message': 'Image processed successfully',
             'input': {
-                'filename': file.filename,
+                'filename': filename,
                 'size': input_size,
             },
             'output': {
                 'size': output_size,
-                'image_data': f'data:image/png;base64,{img_base64}'  # Base64 data URL
+                'image_data': _STREAMED_IMAGE  # Base64 data URL, streamed
             },
             'processing_time': f"{elapsed:.2f}s"
         }
@@ -157,18 +566,10 @@ def denoise_image():
             print(f"  PSNR: {metrics['psnr']:.2f} dB")
             print(f"  SSIM: {metrics['ssim']:.4f}")
 
-        return jsonify(response_data)
+        return streaming_json_response(response_data, encode_jpeg(result_image))
 
     except Exception as e:
         print(f"Error processing image: {str(e)}")
-        # Try to clean up on error too
-        try:
-            if 'input_path' in locals() and os.path.exists(input_path):
-                os.remove(input_path)
-            if 'output_path' in locals() and os.path.exists(output_path):
-                os.remove(output_path)
-        except:
-            pass
         return jsonify({
             'error': 'Failed to process image',
             'details': str(e)
@@ -176,51 +577,37 @@ def denoise_image():
 
 
 @app.route('/api/pipeline', methods=['POST'])
-def process_pipeline():
+@image_upload
+def process_pipeline(filename, uploaded_img, form):
     """
     Flexible processing pipeline with step selection
     """
     try:
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
-
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-
-        if not allowed_file(file.filename):
-            return jsonify({'error': f'Invalid file type'}), 400
-
         # Get step toggles
-        enable_preprocess = request.form.get('enable_preprocess', 'true').lower() == 'true'
-        enable_deblur = request.form.get('enable_deblur', 'true').lower() == 'true'
-        enable_edsr = request.form.get('enable_edsr', 'true').lower() == 'true'
-        enable_face_enhance = request.form.get('enable_face_enhance', 'false').lower() == 'true'
-        evaluation_mode = request.form.get('evaluation_mode', 'false').lower() == 'true'
+        enable_preprocess = form_flag(form, 'enable_preprocess', True)
+        enable_deblur = form_flag(form, 'enable_deblur', True)
+        enable_edsr = form_flag(form, 'enable_edsr', True)
+        enable_face_enhance = form_flag(form, 'enable_face_enhance', False)
+        evaluation_mode = form_flag(form, 'evaluation_mode', False)
 
         # Get degradation options (for evaluation mode)
-        enable_blur_noise = request.form.get('enable_blur_noise', 'false').lower() == 'true'
-        enable_downscale = request.form.get('enable_downscale', 'false').lower() == 'true'
+        enable_blur_noise = form_flag(form, 'enable_blur_noise', False)
+        enable_downscale = form_flag(form, 'enable_downscale', False)
 
-        # Save uploaded file
-        file_ext = file.filename.rsplit('.', 1)[1].lower()
-        unique_id = str(uuid.uuid4())
-        input_filename = f"{unique_id}_input.{file_ext}"
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], input_filename)
-        file.save(input_path)
-
-        print(f"Processing pipeline for: {input_filename}")
+        print(f"Processing pipeline for: {filename}")
         print(f"  Steps: Preprocess={enable_preprocess}, RealESRGAN={enable_deblur}, EDSR={enable_edsr}")
         print(f"  Evaluation Mode: {evaluation_mode}")
-        start_time = datetime.now()
+        start_time = time.perf_counter()
 
-        # Load original image
-        uploaded_img = Image.open(input_path)
+        # Stage name -> Future of the encoded data URL (or None if skipped).
+        # Each stage output is encoded in the background while the next stage runs.
         result = {}
         metrics_result = {}
+        current_array = None  # Set when the previous stage produced a numpy array
 
         # Evaluation Mode: degrade the image first
         if evaluation_mode:
+            from src.degradation import degrade_for_evaluation
             print(f"  [Evaluation Mode] Degrading image with options: "
                   f"blur_noise={enable_blur_noise}, downscale={enable_downscale}")
             ground_truth = uploaded_img  # High-quality ground truth
@@ -240,8 +627,8 @@ def process_pipeline():
 
             current_img = degraded_img
 
-            result['ground_truth'] = ground_truth
-            result['degraded'] = degraded_img
+            result['ground_truth'] = _ENCODE_EXECUTOR.submit(image_to_data_url, ground_truth)
+            result['degraded'] = _ENCODE_EXECUTOR.submit(image_to_data_url, degraded_img)
             reference_img = ground_truth  
             print(f"  [Evaluation Mode] Ground truth size: {ground_truth.size}, Degraded size: {degraded_img.size}")
 
@@ -254,9 +641,10 @@ def process_pipeline():
 
         # Step 1: Preprocessing
         if enable_preprocess:
+            from src.preprocessing import preprocess_pipeline_custom
             print("  [1] Preprocessing...")
             preprocessed_img = preprocess_pipeline_custom(
-                input_path,
+                uploaded_img,
                 None,
                 remove_artifacts=False,
                 enhance_contrast=True,
@@ -266,7 +654,7 @@ def process_pipeline():
                 gamma=None
             )
             current_img = preprocessed_img
-            result['preprocessed'] = preprocessed_img
+            result['preprocessed'] = _ENCODE_EXECUTOR.submit(image_to_data_url, preprocessed_img)
 
             if evaluation_mode:
                 from src.metrics import calculate_all_metrics
@@ -280,26 +668,26 @@ def process_pipeline():
         if enable_deblur:
             face_str = "+GFPGAN" if enable_face_enhance else ""
             print(f"  [2] Real-ESRGAN Super-Resolution{face_str}...")
-            realesrgan_model = get_realesrgan_model(
-                model_path=os.path.join('models', 'RealESRGAN_x4plus.pth'),
-                scale=4, device='cuda'
-            )
+            realesrgan_model = get_deblur_model()
 
-            deblur_result = realesrgan_model.infer_from_pil(
-                current_img,
+            # Keep the output as an array so EDSR can consume it without
+            # another PIL -> numpy conversion of the 4x image
+            deblur_result = realesrgan_model.infer_from_array(
+                np.array(current_img.convert('RGB')),
                 face_enhance=enable_face_enhance,
                 calculate_metrics=evaluation_mode,
                 reference_image=reference_img if evaluation_mode else None
             )
 
             if evaluation_mode:
-                deblurred_img, deblur_metrics = deblur_result
+                deblurred_array, deblur_metrics = deblur_result
                 metrics_result['deblurred'] = deblur_metrics
             else:
-                deblurred_img = deblur_result
+                deblurred_array = deblur_result
 
-            current_img = deblurred_img
-            result['deblurred'] = deblurred_img
+            current_img = Image.fromarray(deblurred_array)
+            current_array = deblurred_array
+            result['deblurred'] = _ENCODE_EXECUTOR.submit(image_to_data_url, current_img)
         else:
             print("  [2] Real-ESRGAN skipped")
             result['deblurred'] = None
@@ -309,12 +697,20 @@ def process_pipeline():
             print("  [3] EDSR Super-Resolution...")
             edsr_model = get_edsr_model()
 
-            edsr_result = edsr_model.infer_from_pil(
-                current_img,
-                output_path=None,
-                calculate_metrics=evaluation_mode,
-                reference_image=reference_img if evaluation_mode else None
-            )
+            if current_array is not None:
+                edsr_result = edsr_model.infer_from_array(
+                    current_array,
+                    output_path=None,
+                    calculate_metrics=evaluation_mode,
+                    reference_image=reference_img if evaluation_mode else None
+                )
+            else:
+                edsr_result = edsr_model.infer_from_pil(
+                    current_img,
+                    output_path=None,
+                    calculate_metrics=evaluation_mode,
+                    reference_image=reference_img if evaluation_mode else None
+                )
 
             if evaluation_mode:
                 edsr_img, edsr_metrics = edsr_result
@@ -322,12 +718,12 @@ def process_pipeline():
             else:
                 edsr_img = edsr_result
 
-            result['edsr'] = edsr_img
+            result['edsr'] = _ENCODE_EXECUTOR.submit(image_to_data_url, edsr_img)
         else:
             print("  [3] EDSR skipped")
             result['edsr'] = None
 
-        elapsed = (datetime.now() - start_time).total_seconds()
+        elapsed = time.perf_counter() - start_time
         print(f"Pipeline completed in {elapsed:.2f}s")
 
         # Print metrics if calculated
@@ -336,30 +732,16 @@ def process_pipeline():
             for step, metrics in metrics_result.items():
                 print(f"  {step}: PSNR={metrics['psnr']:.2f} dB, SSIM={metrics['ssim']:.4f}")
 
-        # Convert to base64
-        def img_to_base64(img):
-            if img is None:
-                return None
-            buffered = BytesIO()
-            img.save(buffered, format="PNG")
-            return f'data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode("utf-8")}'
-
-        # Clean up
-        try:
-            os.remove(input_path)
-        except Exception as e:
-            print(f"Cleanup warning: {e}")
-
         # Build response
         response_data = {
             'success': True,
             'message': 'Pipeline completed',
             'evaluation_mode': evaluation_mode,
-            'ground_truth': img_to_base64(result.get('ground_truth')),
-            'degraded': img_to_base64(result.get('degraded')),
-            'preprocessed': img_to_base64(result.get('preprocessed')),
-            'deblurred': img_to_base64(result.get('deblurred')),
-            'edsr': img_to_base64(result.get('edsr')),
+            'ground_truth': result['ground_truth'].result() if result['ground_truth'] else None,
+            'degraded': result['degraded'].result() if result['degraded'] else None,
+            'preprocessed': result['preprocessed'].result() if result['preprocessed'] else None,
+            'deblurred': result['deblurred'].result() if result['deblurred'] else None,
+            'edsr': result['edsr'].result() if result['edsr'] else None,
             'processing_time': f"{elapsed:.2f}s"
         }
 
@@ -367,15 +749,10 @@ def process_pipeline():
         if evaluation_mode and metrics_result:
             response_data['metrics'] = metrics_result
 
-        return jsonify(response_data)
+        return json_response(response_data)
 
     except Exception as e:
         print(f"Pipeline error: {str(e)}")
-        try:
-            if 'input_path' in locals() and os.path.exists(input_path):
-                os.remove(input_path)
-        except:
-            pass
         return jsonify({'error': str(e)}), 500
 
 
@@ -383,15 +760,20 @@ def process_pipeline():
 def serve_image(filename):
     """Serve processed or uploaded images"""
     try:
-        # Check upload folder first
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(upload_path):
-            return send_file(upload_path, mimetype='image/png')
-
-        # Check output folder
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-        if os.path.exists(output_path):
-            return send_file(output_path, mimetype='image/png')
+        # Check upload folder first, then output folder. send_from_directory
+        # handles 404s, path safety and If-None-Match / 304 responses.
+        for folder in (app.config['UPLOAD_FOLDER'], app.config['OUTPUT_FOLDER']):
+            try:
+                response = send_from_directory(
+                    os.path.abspath(folder), filename,
+                    max_age=IMAGE_CACHE_MAX_AGE, conditional=True
+                )
+            except NotFound:
+                continue
+
+            # Filenames are unique per upload, so the content never changes
+            response.headers['Cache-Control'] = f'public, max-age={IMAGE_CACHE_MAX_AGE}, immutable'
+            return response
 
         return jsonify({'error': 'Image not found'}), 404
 
@@ -403,21 +785,12 @@ def serve_image(filename):
 def cleanup_old_files():
     """Clean up old uploaded/processed files (optional maintenance endpoint)"""
     try:
-        import time
-        from pathlib import Path
-
         # Delete files older than 1 hour
-        current_time = time.time()
         max_age = 3600  # 1 hour in seconds
 
         deleted_count = 0
         for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER]:
-            for filepath in Path(folder).glob('*'):
-                if filepath.is_file():
-                    file_age = current_time - filepath.stat().st_mtime
-                    if file_age > max_age:
-                        filepath.unlink()
-                        deleted_count += 1
+            deleted_count += remove_old_files(folder, max_age)
 
         return jsonify({
             'success': True,
@@ -437,4 +810,11 @@ if __name__ == '__main__':
     print(f"Output folder: {OUTPUT_FOLDER}")
     print("=" * 50)
 
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    debug = os.environ.get('FLASK_DEBUG', '0') == '1'
+
+    # With the debug reloader the weights would otherwise be loaded twice:
+    # only warm up inside the reloaded child process
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warmup_models()
+
+    app.run(host='0.0.0.0', port=5000, debug=debug)
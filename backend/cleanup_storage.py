@@ -4,7 +4,45 @@ Run this if you want to clear all temporary files
 """
 
 import os
-import glob
+import stat
+import time
+
+def remove_old_files(folder, max_age=None):
+    """
+    Remove regular files from a folder (keeps .gitkeep)
+
+    Args:
+        folder: Folder to clean
+        max_age: Only remove files older than this many seconds
+                 (None removes all files)
+
+    Returns:
+        Number of deleted files
+    """
+    if not os.path.isdir(folder):
+        return 0
+
+    cutoff = None if max_age is None else time.time() - max_age
+
+    deleted = 0
+    for name in os.listdir(folder):
+        if name == '.gitkeep':
+            continue
+        path = os.path.join(folder, name)
+        try:
+            st = os.stat(path, follow_symlinks=False)
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            if cutoff is not None and st.st_mtime >= cutoff:
+                continue
+            os.unlink(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass  # Removed concurrently
+        except OSError as e:
+            print(f"Failed to delete {path}: {e}")
+
+    return deleted
 
 def cleanup_storage():
     """Remove all files from uploads and outputs folders"""
@@ -12,17 +50,9 @@ def cleanup_storage():
 
     total_deleted = 0
     for folder in folders:
-        pattern = os.path.join(folder, '*')
-        files = glob.glob(pattern)
-
-        for file_path in files:
-            if os.path.isfile(file_path) and not file_path.endswith('.gitkeep'):
-                try:
-                    os.remove(file_path)
-                    print(f"Deleted: {file_path}")
-                    total_deleted += 1
-                except Exception as e:
-                    print(f"Failed to delete {file_path}: {e}")
+        deleted = remove_old_files(folder)
+        print(f"Deleted {deleted} file(s) from {folder}")
+        total_deleted += deleted
 
     print(f"\nTotal files deleted: {total_deleted}")
 
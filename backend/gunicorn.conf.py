@@ -0,0 +1,20 @@
+"""
+Gunicorn configuration
+
+Run with: gunicorn -c gunicorn.conf.py app:app
+
+A single worker process keeps one copy of each model per GPU; request
+threads overlap upload parsing, decoding and response encoding while the
+model wrappers serialize the forward passes.
+"""
+
+bind = '0.0.0.0:5000'
+workers = 1
+threads = 8
+timeout = 300  # Large 4x upscales can take a while on first request
+
+
+def post_worker_init(worker):
+    """Load and warm up the models before the worker accepts requests"""
+    from app import warmup_models
+    warmup_models()
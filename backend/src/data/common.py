@@ -1,6 +1,9 @@
 import numpy as np
 import torch
 
+# RGB -> luma weights (ITU-R BT.601)
+_LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
 def set_channel(*args, n_channels=3):
     """Convert image to specified number of channels"""
     def _set_channel(img):
@@ -9,22 +12,36 @@ def set_channel(*args, n_channels=3):
 
         c = img.shape[2]
         if n_channels == 1 and c == 3:
-            # Convert to grayscale
-            img = np.expand_dims(np.mean(img, axis=2), 2)
+            # Convert to grayscale (ITU-R BT.601 luma) in a single float32 pass
+            img = np.einsum('hwc,c->hw', img.astype(np.float32, copy=False), _LUMA_WEIGHTS)
+            img = np.expand_dims(img, 2)
         elif n_channels == 3 and c == 1:
-            # Convert grayscale to RGB
-            img = np.concatenate([img] * n_channels, 2)
+            # Convert grayscale to RGB (read-only zero-stride view, no copy)
+            img = np.broadcast_to(img, img.shape[:2] + (n_channels,))
 
         return img
 
     return [_set_channel(a) for a in args]
 
 def np2Tensor(*args, rgb_range=255):
-    """Convert numpy array to PyTorch tensor"""
+    """
+    Convert numpy array (H, W, C) to a float PyTorch tensor (C, H, W)
+
+    The channel permute is a strided view (no transpose copy); the only
+    full-image pass is the cast to float (none for float32 input).
+    Read-only arrays (e.g. views over a PIL buffer) are accepted without a
+    defensive copy; the result never shares memory with them
+    """
     def _np2Tensor(img):
-        np_transpose = np.ascontiguousarray(img.transpose((2, 0, 1)))
-        tensor = torch.from_numpy(np_transpose).float()
-        tensor.mul_(rgb_range / 255)
+        if img.flags.writeable:
+            tensor = torch.from_numpy(img).permute(2, 0, 1).float()
+        else:
+            # Cast on the NumPy side: astype returns a new (writable) array,
+            # so torch.from_numpy never sees the read-only buffer
+            tensor = torch.from_numpy(img.astype(np.float32)).permute(2, 0, 1)
+        if rgb_range != 255:
+            # Out of place: for float32 input the tensor shares memory with img
+            tensor = tensor.mul(rgb_range / 255)
 
         return tensor
 
@@ -5,22 +5,56 @@ Provides functions to degrade high-quality images for evaluation purposes.
 Used to simulate low-quality inputs for testing super-resolution models.
 """
 
+import threading
+from functools import lru_cache
+from io import BytesIO
+
 import numpy as np
 from PIL import Image, ImageFilter
 import cv2
 
+# Optional: libjpeg-turbo SIMD JPEG codec (falls back to Pillow)
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+# Optional: fused blur + noise kernel (falls back to add_blur + add_gaussian_noise)
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Shared random generator for noise (faster than the legacy np.random API)
+_rng = np.random.default_rng()
+
+# Image modes handled by the OpenCV blur paths (others go through PIL)
+_CV2_MODES = ('RGB', 'L')
 
-def downscale_image(image, scale_factor=4):
+# Thread-local scratch buffers
+_local = threading.local()
+
+
+def downscale_image(image, scale_factor=4, resample=Image.LANCZOS):
     """
     Downscale an image by a given factor
 
     Args:
-        image: PIL Image or numpy array
+        image: PIL Image, numpy array or path to an image file
         scale_factor: Factor to downscale by (e.g., 4 means 1/4 size)
+        resample: PIL resampling filter (default: LANCZOS)
 
     Returns:
         PIL Image at reduced resolution
     """
+    if isinstance(image, str):
+        with Image.open(image) as img:
+            new_size = (img.size[0] // scale_factor, img.size[1] // scale_factor)
+            # JPEGs opened here are not decoded yet: let libjpeg decode
+            # directly at a reduced scale (no-op for other formats)
+            img.draft('RGB', new_size)
+            return img.resize(new_size, resample)
+
     if isinstance(image, np.ndarray):
         image = Image.fromarray(image)
 
@@ -28,7 +62,7 @@ def downscale_image(image, scale_factor=4):
     new_size = (original_size[0] // scale_factor, original_size[1] // scale_factor)
 
     # Use LANCZOS for high-quality downscaling
-    downscaled = image.resize(new_size, Image.LANCZOS)
+    downscaled = image.resize(new_size, resample)
 
     return downscaled
 
@@ -44,16 +78,16 @@ def add_gaussian_noise(image, sigma=10):
     Returns:
         PIL Image with added noise
     """
-    img_array = np.array(image).astype(np.float32)
+    img_array = np.asarray(image)
 
-    # Generate Gaussian noise
-    noise = np.random.normal(0, sigma, img_array.shape)
+    # Generate Gaussian noise directly in float32 and reuse its buffer
+    # for the sum and the clip
+    noisy = _rng.standard_normal(img_array.shape, dtype=np.float32)
+    noisy *= sigma
+    np.add(noisy, img_array, out=noisy)
+    np.clip(noisy, 0, 255, out=noisy)
 
-    # Add noise and clip to valid range
-    noisy = img_array + noise
-    noisy = np.clip(noisy, 0, 255).astype(np.uint8)
-
-    return Image.fromarray(noisy)
+    return Image.fromarray(noisy.astype(np.uint8))
 
 
 def add_blur(image, blur_type='gaussian', kernel_size=5):
@@ -71,52 +105,196 @@ def add_blur(image, blur_type='gaussian', kernel_size=5):
     if blur_type == 'gaussian':
         # Gaussian blur
         radius = kernel_size / 2
-        blurred = image.filter(ImageFilter.GaussianBlur(radius=radius))
+        if image.mode in _CV2_MODES:
+            # Separable filter with a cached kernel (OpenCV SIMD path)
+            kernel = _gaussian_kernel_1d(radius)
+            blurred_array = cv2.sepFilter2D(
+                np.asarray(image), -1, kernel, kernel,
+                borderType=cv2.BORDER_REFLECT
+            )
+            blurred = Image.fromarray(blurred_array)
+        else:
+            blurred = image.filter(ImageFilter.GaussianBlur(radius=radius))
     elif blur_type == 'box':
         # Box blur
-        blurred = image.filter(ImageFilter.BoxBlur(radius=kernel_size//2))
+        radius = kernel_size // 2
+        if image.mode in _CV2_MODES:
+            # Running-sum box filter, O(1) per pixel for any kernel size
+            size = 2 * radius + 1
+            blurred_array = cv2.boxFilter(
+                np.asarray(image), -1, (size, size), normalize=True,
+                borderType=cv2.BORDER_REFLECT
+            )
+            blurred = Image.fromarray(blurred_array)
+        else:
+            blurred = image.filter(ImageFilter.BoxBlur(radius=radius))
     elif blur_type == 'motion':
-        # Motion blur using OpenCV
-        img_array = np.array(image)
-
-        # Create motion blur kernel
-        kernel = np.zeros((kernel_size, kernel_size))
-        kernel[int((kernel_size-1)/2), :] = np.ones(kernel_size)
-        kernel = kernel / kernel_size
-
-        # Apply motion blur
-        blurred_array = cv2.filter2D(img_array, -1, kernel)
-        blurred = Image.fromarray(blurred_array.astype(np.uint8))
+        # Horizontal motion blur: the kernel is a single row of ones, so a
+        # 1D box filter (running sum, independent of kernel size) is
+        # equivalent to the full 2D convolution
+        img_array = np.asarray(image)
+        blurred_array = cv2.boxFilter(
+            img_array, -1, (kernel_size, 1), normalize=True,
+            borderType=cv2.BORDER_REFLECT_101
+        )
+        blurred = Image.fromarray(blurred_array)
     else:
         blurred = image
 
     return blurred
 
 
-def jpeg_compression(image, quality=50):
+def add_blur_and_noise(image, kernel_size=3, sigma=8):
+    """
+    Gaussian blur followed by Gaussian noise
+
+    Same as add_blur(blur_type='gaussian') + add_gaussian_noise, but when
+    numba is available both run in one fused, multi-threaded kernel
+    (separable blur, noise, clip and quantize without intermediate images
+    besides the noise itself). Borders are reflected in both paths.
+
+    Args:
+        image: PIL Image
+        kernel_size: Blur kernel size (blur radius is kernel_size / 2)
+        sigma: Standard deviation of noise
+
+    Returns:
+        PIL Image with blur and noise
+    """
+    if numba is None or image.mode not in ('RGB', 'L'):
+        blurred = add_blur(image, blur_type='gaussian', kernel_size=kernel_size)
+        return add_gaussian_noise(blurred, sigma=sigma)
+
+    img_array = np.asarray(image)
+    if img_array.ndim == 2:
+        img_array = img_array[:, :, None]
+
+    # Noise comes from the shared generator, as in add_gaussian_noise
+    noise = _rng.standard_normal(img_array.shape, dtype=np.float32)
+    out = np.empty(img_array.shape, dtype=np.uint8)
+    _blur_noise_kernel(img_array, _gaussian_kernel_1d(kernel_size / 2), np.float32(sigma), noise, out)
+
+    return Image.fromarray(out[:, :, 0] if image.mode == 'L' else out, mode=image.mode)
+
+
+@lru_cache(maxsize=32)
+def _gaussian_kernel_1d(radius, dtype=np.float32):
+    """Normalized 1D Gaussian kernel (std = radius, truncated at 3 std), cached per (radius, dtype)"""
+    if radius <= 0:
+        # Identity, like PIL's GaussianBlur(radius=0)
+        kernel = np.ones(1, dtype=dtype)
+        kernel.flags.writeable = False
+        return kernel
+    half = max(1, int(np.ceil(3 * radius)))
+    x = np.arange(-half, half + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (x / radius) ** 2)
+    kernel = (kernel / kernel.sum()).astype(dtype)
+    kernel.flags.writeable = False  # shared between callers
+    return kernel
+
+
+if numba is not None:
+    @numba.njit(inline='always', cache=True)
+    def _reflect_index(i, n):
+        """Border index as cv2.BORDER_REFLECT (fedcba|abcdefgh|hgfedcb)"""
+        if n == 1:
+            return 0
+        while i < 0 or i >= n:
+            if i < 0:
+                i = -i - 1
+            else:
+                i = 2 * n - i - 1
+        return i
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _blur_noise_kernel(img, kernel, sigma, noise, out):
+        """Separable Gaussian blur + Gaussian noise + clip to uint8 (reflected borders, as add_blur)"""
+        height, width, channels = img.shape
+        radius = kernel.shape[0] // 2
+        tmp = np.empty((height, width, channels), dtype=np.float32)
+
+        # Horizontal pass
+        for y in numba.prange(height):
+            for x in range(width):
+                for c in range(channels):
+                    acc = np.float32(0.0)
+                    for k in range(-radius, radius + 1):
+                        xx = _reflect_index(x + k, width)
+                        acc += kernel[k + radius] * img[y, xx, c]
+                    tmp[y, x, c] = acc
+
+        # Vertical pass + noise + quantize
+        for y in numba.prange(height):
+            for x in range(width):
+                for c in range(channels):
+                    acc = np.float32(0.0)
+                    for k in range(-radius, radius + 1):
+                        yy = _reflect_index(y + k, height)
+                        acc += kernel[k + radius] * tmp[yy, x, c]
+                    value = acc + sigma * noise[y, x, c]
+                    out[y, x, c] = np.uint8(min(max(value, 0.0), 255.0))
+
+
+def jpeg_compression(image, quality=50, return_buffer=False):
     """
     Apply JPEG compression artifacts
 
     Args:
         image: PIL Image
         quality: JPEG quality (0-100, lower means more artifacts)
+        return_buffer: Return the encoded JPEG (BytesIO) without decoding it,
+                       e.g. to decode it directly at a reduced size
 
     Returns:
-        PIL Image with compression artifacts
+        PIL Image with compression artifacts (or BytesIO with return_buffer=True)
     """
-    from io import BytesIO
-
-    # Save to bytes with JPEG compression
-    buffer = BytesIO()
-    image.save(buffer, format='JPEG', quality=quality)
+    if simplejpeg is not None and image.mode == 'RGB':
+        # libjpeg-turbo encode / fast SIMD decode
+        data = simplejpeg.encode_jpeg(np.asarray(image), quality=quality, colorspace='RGB')
+        if return_buffer:
+            return BytesIO(data)
+        return Image.fromarray(
+            simplejpeg.decode_jpeg(data, colorspace='RGB', fastdct=True, fastupsample=True)
+        )
+
+    # The buffer is only reused when it is decoded right here
+    buffer = BytesIO() if return_buffer else _thread_buffer()
+
+    # Save to bytes with JPEG compression (throw-away encode: skip the
+    # optimize / progressive passes)
+    image.save(buffer, format='JPEG', quality=quality, optimize=False, progressive=False)
     buffer.seek(0)
 
+    if return_buffer:
+        return buffer
+
     # Load back the compressed image
     compressed = Image.open(buffer).convert('RGB')
 
     return compressed
 
 
+def _thread_buffer():
+    """Per-thread reusable BytesIO for jpeg_compression"""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = BytesIO()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return buffer
+
+
+def _jpeg_then_downscale(image, quality, scale_factor):
+    """
+    JPEG compression followed by downscaling
+
+    The compressed JPEG is decoded directly at reduced size (see
+    downscale_image) instead of being fully decoded first.
+    """
+    buffer = jpeg_compression(image, quality=quality, return_buffer=True)
+    return downscale_image(Image.open(buffer), scale_factor=scale_factor).convert('RGB')
+
+
 def degrade_for_evaluation(image, degradation_type=None, scale=4,
                           enable_blur_noise=True, enable_downscale=False, **kwargs):
     """
@@ -154,8 +332,7 @@ def degrade_for_evaluation(image, degradation_type=None, scale=4,
     if enable_blur_noise:
         blur_kernel = kwargs.get('blur_kernel', 3)
         noise_sigma = kwargs.get('noise_sigma', 8)
-        degraded = add_blur(degraded, blur_type='gaussian', kernel_size=blur_kernel)
-        degraded = add_gaussian_noise(degraded, sigma=noise_sigma)
+        degraded = add_blur_and_noise(degraded, kernel_size=blur_kernel, sigma=noise_sigma)
 
     # Step 2: Apply downscaling if enabled
     if enable_downscale:
@@ -174,8 +351,7 @@ def _degrade_legacy(image, degradation_type, scale=4, **kwargs):
         blur_kernel = kwargs.get('blur_kernel', 3)
         noise_sigma = kwargs.get('noise_sigma', 8)
 
-        degraded = add_blur(image, blur_type='gaussian', kernel_size=blur_kernel)
-        degraded = add_gaussian_noise(degraded, sigma=noise_sigma)
+        degraded = add_blur_and_noise(image, kernel_size=blur_kernel, sigma=noise_sigma)
 
     elif degradation_type == 'medium':
         # Medium degradation: blur + noise + light compression + 2x downscale
@@ -183,10 +359,8 @@ def _degrade_legacy(image, degradation_type, scale=4, **kwargs):
         noise_sigma = kwargs.get('noise_sigma', 10)
         jpeg_quality = kwargs.get('jpeg_quality', 75)
 
-        degraded = add_blur(image, blur_type='gaussian', kernel_size=blur_kernel)
-        degraded = add_gaussian_noise(degraded, sigma=noise_sigma)
-        degraded = jpeg_compression(degraded, quality=jpeg_quality)
-        degraded = downscale_image(degraded, scale_factor=2)  # Only 2x downscale
+        degraded = add_blur_and_noise(image, kernel_size=blur_kernel, sigma=noise_sigma)
+        degraded = _jpeg_then_downscale(degraded, jpeg_quality, scale_factor=2)  # Only 2x downscale
 
     elif degradation_type == 'heavy':
         # Heavy degradation: blur + noise + compression + 4x downscale
@@ -194,10 +368,8 @@ def _degrade_legacy(image, degradation_type, scale=4, **kwargs):
         noise_sigma = kwargs.get('noise_sigma', 12)
         jpeg_quality = kwargs.get('jpeg_quality', 60)
 
-        degraded = add_blur(image, blur_type='gaussian', kernel_size=blur_kernel)
-        degraded = add_gaussian_noise(degraded, sigma=noise_sigma)
-        degraded = jpeg_compression(degraded, quality=jpeg_quality)
-        degraded = downscale_image(degraded, scale_factor=4)
+        degraded = add_blur_and_noise(image, kernel_size=blur_kernel, sigma=noise_sigma)
+        degraded = _jpeg_then_downscale(degraded, jpeg_quality, scale_factor=4)
 
     elif degradation_type == 'bicubic':
         # Simple bicubic downscaling
@@ -218,8 +390,7 @@ def _degrade_legacy(image, degradation_type, scale=4, **kwargs):
     elif degradation_type == 'jpeg_downscale':
         # JPEG compression then downscale
         jpeg_quality = kwargs.get('jpeg_quality', 50)
-        compressed = jpeg_compression(image, quality=jpeg_quality)
-        degraded = downscale_image(compressed, scale_factor=scale)
+        degraded = _jpeg_then_downscale(image, jpeg_quality, scale_factor=scale)
 
     elif degradation_type == 'realistic':
         # Realistic degradation: blur + noise + compression + downscale
@@ -228,15 +399,12 @@ def _degrade_legacy(image, degradation_type, scale=4, **kwargs):
         jpeg_quality = kwargs.get('jpeg_quality', 70)
 
         # Apply degradations in sequence
-        degraded = add_blur(image, blur_type='gaussian', kernel_size=blur_kernel)
-        degraded = add_gaussian_noise(degraded, sigma=noise_sigma)
-        degraded = jpeg_compression(degraded, quality=jpeg_quality)
-        degraded = downscale_image(degraded, scale_factor=scale)
+        degraded = add_blur_and_noise(image, kernel_size=blur_kernel, sigma=noise_sigma)
+        degraded = _jpeg_then_downscale(degraded, jpeg_quality, scale_factor=scale)
 
     else:
         # Default to light degradation
-        degraded = add_blur(image, blur_type='gaussian', kernel_size=3)
-        degraded = add_gaussian_noise(degraded, sigma=8)
+        degraded = add_blur_and_noise(image, kernel_size=3, sigma=8)
 
     return degraded
 
@@ -1,20 +1,61 @@
 import os
+import time
+import queue
+import threading
+from collections import OrderedDict
 import torch
 import numpy as np
 from PIL import Image
 
 from .model import EDSR
 from .data import np2Tensor, set_channel
-from .metrics import calculate_all_metrics
+from .metrics import calculate_reference_metrics
+
+# Supported inference precisions (on CPU only bf16 is used, and only when
+# the CPU has native bf16 support; anything else runs in fp32)
+DTYPES = {
+    'fp32': torch.float32,
+    'fp16': torch.float16,
+    'bf16': torch.bfloat16,
+}
+
+
+def _cpu_supports_bf16():
+    """Whether oneDNN can run bf16 convolutions natively (AVX512-BF16 / AMX)"""
+    is_supported = getattr(torch.ops.mkldnn, '_is_mkldnn_bf16_supported', None)
+    try:
+        return torch.backends.mkldnn.is_available() and bool(is_supported and is_supported())
+    except RuntimeError:
+        return False
+
+
+def _resolve_dtype(dtype, device):
+    """Map a requested precision to the torch dtype actually used on device"""
+    if device.type == 'cuda':
+        return DTYPES[dtype]
+    if dtype == 'bf16' and _cpu_supports_bf16():
+        return torch.bfloat16
+    return torch.float32
+
+
+class _BatchRequest:
+    """A single input waiting for the batch worker"""
+
+    def __init__(self, img_tensor):
+        self.input = img_tensor
+        self.output = None
+        self.error = None
+        self.done = threading.Event()
 
 
 class EDSRInference:
     """
     Simplified EDSR inference wrapper for image denoising/super-resolution
-    Optimized for CPU deployment
+    Runs on CPU (fp32, or bf16 where supported) or CUDA (fp16 by default)
     """
 
-    def __init__(self, model_path, scale=4, device='cpu'):
+    def __init__(self, model_path, scale=4, device='cpu', dtype='fp16', tile=0, tile_pad=16,
+                 optimize=True, max_batch=1, batch_timeout=0.005):
         """
         Initialize EDSR model for inference
 
@@ -22,9 +63,24 @@ class EDSRInference:
             model_path: Path to the pretrained .pt file
             scale: Upscaling factor (2, 3, or 4)
             device: 'cpu' or 'cuda'
+            dtype: 'fp32', 'fp16' or 'bf16'. On CUDA any of them; on CPU
+                   'bf16' runs in bf16 if the CPU supports it natively, and
+                   everything else falls back to fp32
+            tile: Tile size for inference on large images (0 = whole image)
+            tile_pad: Context pixels added around each tile (cropped from the output)
+            optimize: Trace and freeze the model with TorchScript for inference
+            max_batch: Maximum number of concurrent requests run as one batch
+                       (1 = no batching)
+            batch_timeout: Seconds to wait for more requests to join a batch
         """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown dtype: {dtype}")
+
         self.device = torch.device(device)
         self.scale = scale
+        self.dtype = _resolve_dtype(dtype, self.device)
+        self.tile = tile
+        self.tile_pad = tile_pad
 
         # Create model (EDSR-baseline parameters)
         self.model = EDSR(
@@ -44,37 +100,230 @@ class EDSRInference:
         else:
             raise FileNotFoundError(f"Model file not found: {model_path}")
 
-        # Set to evaluation mode and move to device
+        # Set to evaluation mode and move to device; the weights never need
+        # gradients
         self.model.eval()
-        self.model.to(self.device)
+        self.model.requires_grad_(False)
+        self.model.to(self.device, dtype=self.dtype, memory_format=torch.channels_last)
+
+        # Callable used for the forward pass (the eager model unless optimized)
+        self._runner = self._optimize_model() if optimize else self.model
+
+        # Reusable pinned host / device input buffers for the CUDA path
+        # (grown on demand, shared across requests)
+        self._lock = threading.Lock()
+        self._pinned_input = None
+        self._device_input = None
+        self._copy_done = None
+        self._copy_stream = torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
+
+        # Dynamic batching: concurrent requests are queued and a single
+        # worker thread runs same-sized inputs together in one forward
+        self.max_batch = max_batch
+        self.batch_timeout = batch_timeout
+        self._batch_queue = None
+        self._batch_closed = False
+        self._batch_queue_lock = threading.Lock()
+        if max_batch > 1:
+            self._batch_queue = queue.Queue()
+            threading.Thread(target=self._batch_worker, daemon=True).start()
+
+        print(f"EDSR model loaded successfully on {device} ({self.dtype})")
+
+    def _optimize_model(self):
+        """
+        Trace and freeze the model with TorchScript
+
+        Removes per-layer Python dispatch; the model is fully convolutional,
+        so the trace is valid for any input size. Falls back to the eager
+        model if tracing fails.
+        """
+        example = torch.zeros(
+            (1, 3, 64, 64), device=self.device, dtype=self.dtype
+        ).to(memory_format=torch.channels_last)
+
+        try:
+            with torch.no_grad():
+                traced = torch.jit.trace(self.model, example)
+                traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+            return traced
+        except Exception as e:
+            print(f"[Warning] TorchScript optimization failed, using eager model: {e}")
+            return self.model
+
+    def _stage_input(self, img_tensor):
+        """
+        Copy a CPU input tensor to the device through the reusable buffers
 
-        # Optimize for CPU inference
-        if device == 'cpu':
-            torch.set_num_threads(4)
+        Must be called with self._lock held.
 
-        print(f"EDSR model loaded successfully on {device}")
+        Args:
+            img_tensor: CPU tensor (1, C, H, W)
 
-    def preprocess(self, image_path):
+        Returns:
+            Tensor on self.device in self.dtype and channels_last layout
+            (a view into the device buffer on CUDA)
+        """
+        if self.device.type != 'cuda':
+            return img_tensor.to(self.device, dtype=self.dtype, memory_format=torch.channels_last)
+
+        numel = img_tensor.numel()
+        if self._pinned_input is None or self._pinned_input.numel() < numel:
+            self._pinned_input = torch.empty(numel, dtype=torch.float32).pin_memory()
+            self._device_input = torch.empty(numel, dtype=self.dtype, device=self.device)
+            self._copy_done = torch.cuda.Event()
+        else:
+            # Previous asynchronous copy must finish before the pinned buffer is reused
+            self._copy_done.synchronize()
+
+        # Buffers are laid out as (N, H, W, C), i.e. channels_last
+        batch, channels, height, width = img_tensor.shape
+        nhwc_shape = (batch, height, width, channels)
+        pinned = self._pinned_input[:numel].view(nhwc_shape)
+        pinned.copy_(img_tensor.permute(0, 2, 3, 1))
+        device_input = self._device_input[:numel].view(nhwc_shape)
+
+        # Upload on a side stream; it must not overwrite the device buffer
+        # while an earlier forward on the compute stream may still read it
+        compute_stream = torch.cuda.current_stream(self.device)
+        self._copy_stream.wait_stream(compute_stream)
+        with torch.cuda.stream(self._copy_stream):
+            device_input.copy_(pinned, non_blocking=True)
+            self._copy_done.record(self._copy_stream)
+        compute_stream.wait_stream(self._copy_stream)
+
+        # (N, C, H, W) view of the NHWC buffer
+        return device_input.permute(0, 3, 1, 2)
+
+    def _forward(self, input_tensor):
         """
-        Load and preprocess image for EDSR
+        Run the model, tile by tile when the input is larger than self.tile
+
+        Each tile is run with tile_pad pixels of surrounding context, which
+        are cropped from its output, so tile seams are not visible. Keeps
+        activations small enough to stay in cache (CPU) / fit in memory (GPU).
 
         Args:
-            image_path: Path to input image
+            input_tensor: Model input (1, C, H, W) on self.device
 
         Returns:
-            Tensor ready for model input
+            Model output (1, C, H * scale, W * scale)
         """
-        # Load image and close file handle immediately (important for Windows)
-        with Image.open(image_path) as img:
-            img_np = np.array(img.convert('RGB')).astype(np.float32)
+        _, _, height, width = input_tensor.shape
+        if not self.tile or (height <= self.tile and width <= self.tile):
+            return self._runner(input_tensor)
+
+        scale = self.scale
+        output = input_tensor.new_empty(
+            (input_tensor.shape[0], input_tensor.shape[1], height * scale, width * scale)
+        ).to(memory_format=torch.channels_last)
+
+        for y0 in range(0, height, self.tile):
+            for x0 in range(0, width, self.tile):
+                y1 = min(y0 + self.tile, height)
+                x1 = min(x0 + self.tile, width)
+
+                # Tile plus context, clamped to the image
+                pad_y0 = max(y0 - self.tile_pad, 0)
+                pad_x0 = max(x0 - self.tile_pad, 0)
+                pad_y1 = min(y1 + self.tile_pad, height)
+                pad_x1 = min(x1 + self.tile_pad, width)
+
+                tile_output = self._runner(input_tensor[:, :, pad_y0:pad_y1, pad_x0:pad_x1])
+
+                # Crop the context away and place the tile
+                out_y0 = (y0 - pad_y0) * scale
+                out_x0 = (x0 - pad_x0) * scale
+                output[:, :, y0 * scale:y1 * scale, x0 * scale:x1 * scale] = tile_output[
+                    :, :,
+                    out_y0:out_y0 + (y1 - y0) * scale,
+                    out_x0:out_x0 + (x1 - x0) * scale
+                ]
+
+        return output
+
+    def _run(self, img_tensor):
+        """
+        Run the model on a CPU input tensor (1, C, H, W)
 
-        # Convert to tensor (C, H, W)
-        img_tensor = np2Tensor(img_np, rgb_range=255)[0]
+        Goes through the batch worker when batching is enabled, otherwise
+        runs directly under the lock.
+        """
+        request = _BatchRequest(img_tensor)
+        with self._batch_queue_lock:
+            batched = self._batch_queue is not None and not self._batch_closed
+            if batched:
+                self._batch_queue.put(request)
+        if not batched:
+            with self._lock:
+                return self._forward(self._stage_input(img_tensor))
+
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.output
+
+    def close(self):
+        """
+        Stop the batch worker (e.g. when the instance is evicted from the
+        model cache), so the thread no longer keeps the instance alive
 
-        # Add batch dimension (1, C, H, W)
-        img_tensor = img_tensor.unsqueeze(0)
+        Requests already queued are still processed; later calls run
+        directly under the lock.
+        """
+        with self._batch_queue_lock:
+            if self._batch_queue is None or self._batch_closed:
+                return
+            self._batch_closed = True
+            # Sentinel, queued after every pending request
+            self._batch_queue.put(None)
+
+    def _batch_worker(self):
+        """
+        Collect queued requests for up to batch_timeout seconds (at most
+        max_batch of them) and run inputs of the same shape as one batch
 
-        return img_tensor.to(self.device)
+        Exits after the close() sentinel.
+        """
+        stop = False
+        while not stop:
+            request = self._batch_queue.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = time.monotonic() + self.batch_timeout
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._batch_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            # Only exact shape matches are stacked (no padding artifacts)
+            groups = {}
+            for request in batch:
+                groups.setdefault(tuple(request.input.shape), []).append(request)
+
+            for requests in groups.values():
+                try:
+                    # Grad mode is per thread, so disable it here as well
+                    with self._lock, torch.inference_mode():
+                        batch_input = torch.cat([request.input for request in requests])
+                        output = self._forward(self._stage_input(batch_input))
+                    for request, request_output in zip(requests, output.split(1)):
+                        request.output = request_output
+                except Exception as e:
+                    for request in requests:
+                        request.error = e
+                finally:
+                    for request in requests:
+                        request.done.set()
 
     def postprocess(self, output_tensor):
         """
@@ -86,17 +335,26 @@ class EDSRInference:
         Returns:
             PIL Image
         """
-        # Remove batch dimension and move to CPU
-        output = output_tensor.squeeze(0).cpu()
-
-        # Clamp to valid range and convert to numpy
-        output = output.clamp(0, 255).round()
-        output_np = output.byte().permute(1, 2, 0).numpy()
-
-        # Convert to PIL Image
+        # Clamp and round in place on the device (the output tensor is not
+        # reused), then cast straight into one contiguous (H, W, C) uint8
+        # buffer, so only 1 byte per value is transferred and no transpose
+        # copy is made on the host. On CPU reduced precision output is
+        # rounded in fp32
+        output = output_tensor.squeeze(0)
+        if output.device.type == 'cpu':
+            output = output.float()
+        output = output.clamp_(0, 255).round_()
+
+        channels, height, width = output.shape
+        output_hwc = torch.empty((height, width, channels), dtype=torch.uint8, device=output.device)
+        output_hwc.copy_(output.permute(1, 2, 0))
+        output_np = output_hwc.cpu().numpy()
+
+        # Convert to PIL Image (PIL stores RGB as 4 bytes per pixel, so this
+        # repack is its only copy)
         return Image.fromarray(output_np, mode='RGB')
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def infer(self, image_path, output_path=None, calculate_metrics=False, reference_image=None):
         """
         Run inference on an image
@@ -112,46 +370,23 @@ class EDSRInference:
             If calculate_metrics is False: PIL Image of the processed result
             If calculate_metrics is True: tuple of (PIL Image, metrics dict)
         """
-        # Preprocess
-        input_tensor = self.preprocess(image_path)
-
-        # Run model
-        output_tensor = self.model(input_tensor)
+        # Decode once; the decoded image doubles as the default metrics reference
+        with Image.open(image_path) as img:
+            pil_image = img.convert('RGB')
 
-        # Postprocess
-        output_image = self.postprocess(output_tensor)
+        result = self.infer_from_pil(
+            pil_image,
+            output_path=output_path,
+            calculate_metrics=calculate_metrics,
+            reference_image=reference_image
+        )
 
-        # Save if output path provided
         if output_path:
-            output_image.save(output_path)
             print(f"Saved result to {output_path}")
 
-        # Calculate metrics if requested
-        if calculate_metrics:
-            # Determine reference image
-            if reference_image is None:
-                # Use input image as reference
-                ref_img = Image.open(image_path).convert('RGB')
-            elif isinstance(reference_image, str):
-                # Load from path
-                ref_img = Image.open(reference_image).convert('RGB')
-            else:
-                # Assume it's already a PIL Image
-                ref_img = reference_image.convert('RGB')
-
-            # Resize output to match reference for fair comparison
-            if output_image.size != ref_img.size:
-                output_resized = output_image.resize(ref_img.size, Image.LANCZOS)
-            else:
-                output_resized = output_image
-
-            # Calculate metrics
-            metrics = calculate_all_metrics(ref_img, output_resized)
-            return output_image, metrics
-
-        return output_image
+        return result
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def infer_from_pil(self, pil_image, output_path=None, calculate_metrics=False, reference_image=None):
         """
         Run inference on a PIL Image directly
@@ -167,15 +402,50 @@ class EDSRInference:
             If calculate_metrics is False: PIL Image of the processed result
             If calculate_metrics is True: tuple of (PIL Image, metrics dict)
         """
-        # Convert PIL to numpy
-        img_np = np.array(pil_image.convert('RGB')).astype(np.float32)
+        if calculate_metrics and reference_image is None:
+            # Use input image as reference
+            reference_image = pil_image
+
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+
+        # Read-only view over the raw bytes (one copy out of PIL, no more)
+        img_rgb = np.frombuffer(pil_image.tobytes(), dtype=np.uint8).reshape(
+            pil_image.height, pil_image.width, 3
+        )
+
+        return self.infer_from_array(
+            img_rgb,
+            output_path=output_path,
+            calculate_metrics=calculate_metrics,
+            reference_image=reference_image
+        )
 
+    @torch.inference_mode()
+    def infer_from_array(self, img_rgb, output_path=None, calculate_metrics=False, reference_image=None):
+        """
+        Run inference on an RGB numpy array directly
+
+        Lets the pipeline feed the output of a previous stage (e.g. Real-ESRGAN)
+        without a round-trip through PIL.
+
+        Args:
+            img_rgb: uint8 numpy array (H, W, 3) in RGB order (may be read-only)
+            output_path: Path to save output (optional)
+            calculate_metrics: Whether to calculate quality metrics (default: False)
+            reference_image: Reference image for metrics (PIL Image or path).
+                           If None and calculate_metrics=True, uses input image
+
+        Returns:
+            If calculate_metrics is False: PIL Image of the processed result
+            If calculate_metrics is True: tuple of (PIL Image, metrics dict)
+        """
         # Convert to tensor
-        img_tensor = np2Tensor(img_np, rgb_range=255)[0]
-        img_tensor = img_tensor.unsqueeze(0).to(self.device)
+        img_tensor = np2Tensor(img_rgb, rgb_range=255)[0]
+        img_tensor = img_tensor.unsqueeze(0)
 
         # Run model
-        output_tensor = self.model(img_tensor)
+        output_tensor = self._run(img_tensor)
 
         # Postprocess
         output_image = self.postprocess(output_tensor)
@@ -186,38 +456,38 @@ class EDSRInference:
 
         # Calculate metrics if requested
         if calculate_metrics:
-            # Determine reference image
+            # Use input image as reference by default
             if reference_image is None:
-                # Use input image as reference
-                ref_img = pil_image.convert('RGB')
-            elif isinstance(reference_image, str):
-                # Load from path
-                ref_img = Image.open(reference_image).convert('RGB')
-            else:
-                # Assume it's already a PIL Image
-                ref_img = reference_image.convert('RGB')
-
-            # Resize output to match reference for fair comparison
-            if output_image.size != ref_img.size:
-                output_resized = output_image.resize(ref_img.size, Image.LANCZOS)
-            else:
-                output_resized = output_image
-
-            # Calculate metrics
-            metrics = calculate_all_metrics(ref_img, output_resized)
+                reference_image = img_rgb
+            metrics = calculate_reference_metrics(output_image, reference_image)
             return output_image, metrics
 
         return output_image
 
 
-# Singleton instance for the API
-_model_instance = None
+# Loaded models keyed by configuration, least recently used first
+_MODEL_CACHE_SIZE = 4
+_model_cache = OrderedDict()
+_model_cache_lock = threading.Lock()
 
-def get_model(model_path='models/edsr_baseline_x4-6b446fab.pt', scale=4, device='cpu'):
+def get_model(model_path='models/edsr_baseline_x4-6b446fab.pt', scale=4, device='cpu', dtype='fp16', tile=0,
+              max_batch=1):
     """
-    Get or create model instance (singleton pattern)
+    Get or create a model instance for the given configuration
+
+    Instances are cached per (model_path, scale, device, dtype, tile, max_batch), so
+    asking for a different scale never returns the wrong model. The lock
+    ensures concurrent first requests load the weights only once.
     """
-    global _model_instance
-    if _model_instance is None:
-        _model_instance = EDSRInference(model_path, scale, device)
-    return _model_instance
+    key = (os.path.abspath(model_path), scale, str(device), dtype, tile, max_batch)
+    with _model_cache_lock:
+        if key in _model_cache:
+            _model_cache.move_to_end(key)
+            return _model_cache[key]
+
+        instance = EDSRInference(model_path, scale, device, dtype, tile, max_batch=max_batch)
+        _model_cache[key] = instance
+        if len(_model_cache) > _MODEL_CACHE_SIZE:
+            # Its batch worker would otherwise keep it alive
+            _model_cache.popitem(last=False)[1].close()
+        return instance
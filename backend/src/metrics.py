@@ -8,14 +8,32 @@ Provides metrics for evaluating image super-resolution results:
 - LPIPS (Learned Perceptual Image Patch Similarity) - Full-reference
 """
 
+import os
+import threading
+from functools import lru_cache
+
+import cv2
 import numpy as np
 from PIL import Image
 import torch
 
+# Optional: single-pass SSIM moments kernel (falls back to NumPy)
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # Lazy-load pyiqa models to avoid startup overhead
 _niqe_model = None
 _lpips_model = None
 
+# Device the pyiqa models run on
+_METRICS_DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+# Per-thread reusable buffers for the pyiqa input tensors (pinned host
+# staging for GPU uploads, and the float tensors themselves)
+_staging = threading.local()
+
 
 def calculate_psnr(img1, img2, max_value=255.0):
     """
@@ -29,16 +47,20 @@ def calculate_psnr(img1, img2, max_value=255.0):
     Returns:
         PSNR value in dB (higher is better)
     """
-    # Convert to numpy arrays
-    arr1 = _to_numpy(img1)
-    arr2 = _to_numpy(img2)
+    if _is_tensor_pair(img1, img2):
+        # Stay on the tensors' device
+        mse = _tensor_reduce(img1, img2, 'mse')
+    else:
+        # Convert to numpy arrays
+        arr1 = _to_numpy(img1)
+        arr2 = _to_numpy(img2)
 
-    # Ensure same shape
-    if arr1.shape != arr2.shape:
-        raise ValueError(f"Images must have the same shape. Got {arr1.shape} and {arr2.shape}")
+        # Ensure same shape
+        if arr1.shape != arr2.shape:
+            raise ValueError(f"Images must have the same shape. Got {arr1.shape} and {arr2.shape}")
 
-    # Calculate MSE
-    mse = np.mean((arr1.astype(np.float64) - arr2.astype(np.float64)) ** 2)
+        # Calculate MSE
+        mse = _mean_squared_difference(arr1, arr2)
 
     # Avoid division by zero
     if mse == 0:
@@ -73,18 +95,19 @@ def calculate_ssim(img1, img2, max_value=255.0, window_size=11):
         if arr1.shape != arr2.shape:
             raise ValueError(f"Images must have the same shape. Got {arr1.shape} and {arr2.shape}")
 
-        # For color images, calculate SSIM per channel and average
+        # For color images, SSIM is calculated per channel and averaged
+        # inside a single skimage call
         if len(arr1.shape) == 3:
-            channel_ssim = []
-            for i in range(arr1.shape[2]):
+            try:
+                ssim_val = ssim(
+                    arr1, arr2, data_range=max_value, win_size=window_size, channel_axis=-1
+                )
+            except TypeError:
+                # scikit-image < 0.19
                 ssim_val = ssim(
-                    arr1[:, :, i],
-                    arr2[:, :, i],
-                    data_range=max_value,
-                    win_size=window_size
+                    arr1, arr2, data_range=max_value, win_size=window_size, multichannel=True
                 )
-                channel_ssim.append(ssim_val)
-            return float(np.mean(channel_ssim))
+            return float(ssim_val)
         else:
             # Grayscale image
             return float(ssim(arr1, arr2, data_range=max_value, win_size=window_size))
@@ -99,22 +122,25 @@ def _calculate_ssim_simple(img1, img2, max_value=255.0):
     Simplified SSIM calculation without external dependencies
     This is a basic approximation of SSIM
     """
-    # Convert to numpy arrays
-    arr1 = _to_numpy(img1).astype(np.float64)
-    arr2 = _to_numpy(img2).astype(np.float64)
-
     # Constants
     C1 = (0.01 * max_value) ** 2
     C2 = (0.03 * max_value) ** 2
 
-    # Calculate means
-    mu1 = arr1.mean()
-    mu2 = arr2.mean()
+    arr1 = np.ascontiguousarray(_to_numpy(img1)).ravel()
+    arr2 = np.ascontiguousarray(_to_numpy(img2)).ravel()
 
-    # Calculate variances and covariance
-    sigma1_sq = ((arr1 - mu1) ** 2).mean()
-    sigma2_sq = ((arr2 - mu2) ** 2).mean()
-    sigma12 = ((arr1 - mu1) * (arr2 - mu2)).mean()
+    if numba is not None:
+        # Single fused pass over both images
+        mu1, mu2, sigma1_sq, sigma2_sq, sigma12 = _ssim_moments(arr1, arr2)
+    else:
+        # Same moments from plain and cross sums (float64 accumulation,
+        # no full-size temporaries)
+        n = arr1.size
+        mu1 = arr1.sum(dtype=np.float64) / n
+        mu2 = arr2.sum(dtype=np.float64) / n
+        sigma1_sq = np.einsum('i,i->', arr1, arr1, dtype=np.float64) / n - mu1 * mu1
+        sigma2_sq = np.einsum('i,i->', arr2, arr2, dtype=np.float64) / n - mu2 * mu2
+        sigma12 = np.einsum('i,i->', arr1, arr2, dtype=np.float64) / n - mu1 * mu2
 
     # Calculate SSIM
     ssim = ((2 * mu1 * mu2 + C1) * (2 * sigma12 + C2)) / \
@@ -123,6 +149,38 @@ def _calculate_ssim_simple(img1, img2, max_value=255.0):
     return float(ssim)
 
 
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _ssim_moments(arr1, arr2):
+        """
+        Means, variances and covariance of two flat arrays in one pass
+
+        The five sums are accumulated in float64 (parallel reduction), and
+        the moments are derived from them algebraically.
+        """
+        n = arr1.size
+        sum1 = 0.0
+        sum2 = 0.0
+        sumsq1 = 0.0
+        sumsq2 = 0.0
+        sumprod = 0.0
+        for i in numba.prange(n):
+            x = np.float64(arr1[i])
+            y = np.float64(arr2[i])
+            sum1 += x
+            sum2 += y
+            sumsq1 += x * x
+            sumsq2 += y * y
+            sumprod += x * y
+
+        mu1 = sum1 / n
+        mu2 = sum2 / n
+        sigma1_sq = sumsq1 / n - mu1 * mu1
+        sigma2_sq = sumsq2 / n - mu2 * mu2
+        sigma12 = sumprod / n - mu1 * mu2
+        return mu1, mu2, sigma1_sq, sigma2_sq, sigma12
+
+
 def calculate_mse(img1, img2):
     """
     Calculate Mean Squared Error (MSE) between two images
@@ -134,6 +192,9 @@ def calculate_mse(img1, img2):
     Returns:
         MSE value (lower is better)
     """
+    if _is_tensor_pair(img1, img2):
+        return _tensor_reduce(img1, img2, 'mse')
+
     # Convert to numpy arrays
     arr1 = _to_numpy(img1)
     arr2 = _to_numpy(img2)
@@ -143,7 +204,7 @@ def calculate_mse(img1, img2):
         raise ValueError(f"Images must have the same shape. Got {arr1.shape} and {arr2.shape}")
 
     # Calculate MSE
-    mse = np.mean((arr1.astype(np.float64) - arr2.astype(np.float64)) ** 2)
+    mse = _mean_squared_difference(arr1, arr2)
     return float(mse)
 
 
@@ -158,6 +219,9 @@ def calculate_mae(img1, img2):
     Returns:
         MAE value (lower is better)
     """
+    if _is_tensor_pair(img1, img2):
+        return _tensor_reduce(img1, img2, 'mae')
+
     # Convert to numpy arrays
     arr1 = _to_numpy(img1)
     arr2 = _to_numpy(img2)
@@ -166,11 +230,35 @@ def calculate_mae(img1, img2):
     if arr1.shape != arr2.shape:
         raise ValueError(f"Images must have the same shape. Got {arr1.shape} and {arr2.shape}")
 
-    # Calculate MAE
-    mae = np.mean(np.abs(arr1.astype(np.float64) - arr2.astype(np.float64)))
+    # Calculate MAE (abs in place on the difference, wide accumulator)
+    diff = _difference(arr1, arr2)
+    np.abs(diff, out=diff)
+    mae = diff.sum(dtype=_accumulator_dtype(diff)) / diff.size
     return float(mae)
 
 
+def _get_niqe_model():
+    """Lazy-load the pyiqa NIQE model (raises ImportError without pyiqa)"""
+    global _niqe_model
+
+    if _niqe_model is None:
+        import pyiqa
+        _niqe_model = pyiqa.create_metric('niqe', device=_METRICS_DEVICE)
+        print(f"[Metrics] NIQE model loaded on {_METRICS_DEVICE}")
+    return _niqe_model
+
+
+def _get_lpips_model():
+    """Lazy-load the pyiqa LPIPS model (raises ImportError without pyiqa)"""
+    global _lpips_model
+
+    if _lpips_model is None:
+        import pyiqa
+        _lpips_model = pyiqa.create_metric('lpips', device=_METRICS_DEVICE)
+        print(f"[Metrics] LPIPS model loaded on {_METRICS_DEVICE}")
+    return _lpips_model
+
+
 def calculate_niqe(img):
     """
     Calculate NIQE (Natural Image Quality Evaluator) score
@@ -184,33 +272,14 @@ def calculate_niqe(img):
     Returns:
         NIQE score (lower is better, typical range: 0-100)
     """
-    global _niqe_model
-
     try:
-        import pyiqa
+        niqe_model = _get_niqe_model()
 
-        # Lazy-load NIQE model
-        if _niqe_model is None:
-            _niqe_model = pyiqa.create_metric('niqe', device='cpu')
-            print("[Metrics] NIQE model loaded")
-
-        # Convert to PIL Image if needed
-        if isinstance(img, np.ndarray):
-            img_pil = Image.fromarray(img.astype(np.uint8))
-        elif isinstance(img, torch.Tensor):
-            img_np = _to_numpy(img)
-            img_pil = Image.fromarray(img_np.astype(np.uint8))
-        elif isinstance(img, Image.Image):
-            img_pil = img
-        else:
-            raise TypeError(f"Unsupported image type: {type(img)}")
-
-        # Convert PIL to tensor for pyiqa (expects tensor in [0, 1] range)
-        img_np = np.array(img_pil).astype(np.float32) / 255.0
-        img_tensor = torch.from_numpy(img_np).permute(2, 0, 1).unsqueeze(0)  # (1, C, H, W)
+        # Convert to tensor for pyiqa (expects tensor in [0, 1] range)
+        img_tensor = _to_metric_tensor(img)
 
         # Calculate NIQE score
-        score = _niqe_model(img_tensor)
+        score = niqe_model(img_tensor)
         return float(score.item())
 
     except ImportError:
@@ -235,41 +304,20 @@ def calculate_lpips(img1, img2):
     Returns:
         LPIPS score (lower is better, range: 0-1)
     """
-    global _lpips_model
-
     try:
-        import pyiqa
+        lpips_model = _get_lpips_model()
 
-        # Lazy-load LPIPS model
-        if _lpips_model is None:
-            _lpips_model = pyiqa.create_metric('lpips', device='cpu')
-            print("[Metrics] LPIPS model loaded")
-
-        # Convert both images to tensors
-        def to_tensor(img):
-            if isinstance(img, np.ndarray):
-                img_pil = Image.fromarray(img.astype(np.uint8))
-            elif isinstance(img, torch.Tensor):
-                img_np = _to_numpy(img)
-                img_pil = Image.fromarray(img_np.astype(np.uint8))
-            elif isinstance(img, Image.Image):
-                img_pil = img
-            else:
-                raise TypeError(f"Unsupported image type: {type(img)}")
-
-            # Convert to tensor in [0, 1] range
-            img_np = np.array(img_pil).astype(np.float32) / 255.0
-            return torch.from_numpy(img_np).permute(2, 0, 1).unsqueeze(0)  # (1, C, H, W)
-
-        img1_tensor = to_tensor(img1)
-        img2_tensor = to_tensor(img2)
+        # Convert both images to tensors (separate staging slots, as the
+        # first upload may still be in flight)
+        img1_tensor = _to_metric_tensor(img1, slot=0)
+        img2_tensor = _to_metric_tensor(img2, slot=1)
 
         # Ensure same shape
         if img1_tensor.shape != img2_tensor.shape:
             raise ValueError(f"Images must have same shape. Got {img1_tensor.shape} and {img2_tensor.shape}")
 
         # Calculate LPIPS score
-        score = _lpips_model(img1_tensor, img2_tensor)
+        score = lpips_model(img1_tensor, img2_tensor)
         return float(score.item())
 
     except ImportError:
@@ -284,6 +332,11 @@ def calculate_all_metrics(img1, img2, max_value=255.0):
     """
     Calculate all quality metrics between two images
 
+    For 8-bit color images both images are converted to tensors once and
+    shared by all four metrics: PSNR and SSIM are computed with torch on
+    the metrics device, and the NIQE and LPIPS forwards run on separate
+    CUDA streams so they overlap.
+
     Args:
         img1: Reference/ground truth image (numpy array, torch tensor, or PIL Image)
         img2: Distorted/processed image (numpy array, torch tensor, or PIL Image)
@@ -296,6 +349,83 @@ def calculate_all_metrics(img1, img2, max_value=255.0):
         - niqe: Natural Image Quality Evaluator (lower is better)
         - lpips: Learned Perceptual Similarity (lower is better, 0-1)
     """
+    arr1 = _to_numpy(img1)
+    arr2 = _to_numpy(img2)
+
+    if arr1.shape != arr2.shape:
+        raise ValueError(f"Images must have the same shape. Got {arr1.shape} and {arr2.shape}")
+
+    # Identical images (e.g. output returned unchanged): the full-reference
+    # metrics are known, a single memcmp-style comparison replaces them
+    if np.array_equal(arr1, arr2):
+        return _identical_image_metrics(arr2)
+
+    if max_value != 255.0 or arr1.dtype != np.uint8 or arr2.dtype != np.uint8 or arr1.ndim != 3:
+        return _calculate_all_metrics_separately(arr1, arr2, max_value)
+
+    with torch.inference_mode():
+        t1, t2 = _prepare_tensor_pair(arr1, arr2)
+
+        metrics = {
+            'psnr': _psnr_tensor(t1, t2),
+            'ssim': _ssim_tensor(t1, t2),
+        }
+        metrics.update(_deep_metrics(t1, t2))
+
+    return metrics
+
+
+def calculate_reference_metrics(output_image, reference_image):
+    """
+    Calculate all metrics of a model output against a reference image
+
+    Shared by the EDSR and Real-ESRGAN wrappers. Everything stays a numpy
+    array from here on. The output is resized to the reference size first
+    if needed, with cv2.resize: area averaging when shrinking (the usual
+    case, SR output vs. input), bilinear otherwise. The resize only aligns
+    shapes, so LANCZOS would cost more for no gain here.
+
+    Args:
+        output_image: Model output (PIL Image or uint8 RGB numpy array)
+        reference_image: Reference image (PIL Image, uint8 RGB numpy array, or path)
+
+    Returns:
+        Dictionary with all metrics (see calculate_all_metrics)
+    """
+    if isinstance(reference_image, str):
+        # Decoded once per file version (see _load_reference)
+        ref_arr = _load_reference(reference_image, os.path.getmtime(reference_image))
+    elif isinstance(reference_image, Image.Image) and reference_image.mode != 'RGB':
+        ref_arr = np.asarray(reference_image.convert('RGB'))
+    else:
+        ref_arr = _to_numpy(reference_image)
+
+    output_arr = _to_numpy(output_image)
+    if output_arr.shape[:2] != ref_arr.shape[:2]:
+        shrinking = output_arr.shape[1] > ref_arr.shape[1]
+        output_arr = cv2.resize(
+            output_arr, _array_size(ref_arr),
+            interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+        )
+
+    return calculate_all_metrics(ref_arr, output_arr)
+
+
+@lru_cache(maxsize=8)
+def _load_reference(path, mtime):
+    """
+    Decoded reference image for a path, cached across requests
+
+    mtime is part of the cache key, so a file that is rewritten in place
+    is decoded again. The array is shared between callers, hence read-only.
+    """
+    img = _load_rgb(path)
+    img.setflags(write=False)
+    return img
+
+
+def _calculate_all_metrics_separately(img1, img2, max_value):
+    """calculate_all_metrics for inputs the shared tensor path does not cover"""
     metrics = {
         'psnr': calculate_psnr(img1, img2, max_value),
         'ssim': calculate_ssim(img1, img2, max_value),
@@ -314,6 +444,216 @@ def calculate_all_metrics(img1, img2, max_value=255.0):
     return metrics
 
 
+def _identical_image_metrics(img):
+    """calculate_all_metrics for a pair of identical images"""
+    metrics = {
+        'psnr': float('inf'),
+        'ssim': 1.0,
+    }
+
+    # NIQE is no-reference, so it still has to be computed
+    niqe_score = calculate_niqe(img)
+    if niqe_score is not None:
+        metrics['niqe'] = niqe_score
+        # LPIPS distance of identical inputs is 0 (same pyiqa dependency)
+        metrics['lpips'] = 0.0
+
+    return metrics
+
+
+def _prepare_tensor_pair(arr1, arr2):
+    """Both uint8 images as (1, C, H, W) tensors in [0, 1] on the metrics device"""
+    return _to_metric_tensor(arr1, slot=0), _to_metric_tensor(arr2, slot=1)
+
+
+def _psnr_tensor(t1, t2):
+    """PSNR of two [0, 1] tensors (same value as calculate_psnr on the 8-bit images)"""
+    mse = (t1 - t2).square_().mean(dtype=torch.float64).item()
+    if mse == 0:
+        return float('inf')
+    return float(-10 * np.log10(mse))
+
+
+def _ssim_tensor(t1, t2, window_size=11):
+    """
+    SSIM of two [0, 1] tensors (1, C, H, W)
+
+    Same definition as scikit-image's default structural_similarity used by
+    calculate_ssim: uniform window, sample covariance, border pixels that
+    the window does not fully cover are excluded, channels averaged.
+    """
+    C1 = 0.01 ** 2
+    C2 = 0.03 ** 2
+    cov_norm = window_size ** 2 / (window_size ** 2 - 1)
+
+    # The uniform window is a separable box filter; without padding only
+    # fully covered pixels are produced
+    def window_mean(x):
+        return torch.nn.functional.avg_pool2d(x, window_size, stride=1)
+
+    ux = window_mean(t1)
+    uy = window_mean(t2)
+    vx = cov_norm * (window_mean(t1 * t1) - ux * ux)
+    vy = cov_norm * (window_mean(t2 * t2) - uy * uy)
+    vxy = cov_norm * (window_mean(t1 * t2) - ux * uy)
+
+    ssim_map = ((2 * ux * uy + C1) * (2 * vxy + C2)) / \
+               ((ux * ux + uy * uy + C1) * (vx + vy + C2))
+    return float(ssim_map.mean(dtype=torch.float64).item())
+
+
+def _deep_metrics(t1, t2):
+    """
+    NIQE (on t2) and LPIPS of two prepared tensors
+
+    Returns:
+        Dictionary with 'niqe' / 'lpips' for the metrics that succeeded
+    """
+    try:
+        niqe_model = _get_niqe_model()
+        lpips_model = _get_lpips_model()
+    except ImportError:
+        print("[Warning] pyiqa not installed. Install with: pip install pyiqa")
+        return {}
+
+    def run(name, fn):
+        try:
+            return fn()
+        except Exception as e:
+            print(f"[Warning] {name} calculation failed: {e}")
+            return None
+
+    niqe_score = run('NIQE', lambda: niqe_model(t2))
+    lpips_score = run('LPIPS', lambda: lpips_model(t1, t2))
+
+    metrics = {}
+    if niqe_score is not None:
+        metrics['niqe'] = float(niqe_score.item())
+    if lpips_score is not None:
+        metrics['lpips'] = float(lpips_score.item())
+    return metrics
+
+
+def _is_tensor_pair(img1, img2):
+    """Whether both images are torch tensors on the same device"""
+    return (
+        isinstance(img1, torch.Tensor) and isinstance(img2, torch.Tensor)
+        and img1.device == img2.device
+    )
+
+
+def _tensor_reduce(img1, img2, op):
+    """
+    MSE ('mse') or MAE ('mae') of two tensors, computed on their device
+
+    Avoids copying both images to the host just to reduce them to a scalar.
+    """
+    if img1.shape != img2.shape:
+        raise ValueError(f"Images must have the same shape. Got {tuple(img1.shape)} and {tuple(img2.shape)}")
+
+    with torch.no_grad():
+        diff = img1.float() - img2.float()
+        if op == 'mse':
+            diff.square_()
+        else:
+            diff.abs_()
+        return float(diff.mean(dtype=torch.float64).item())
+
+
+def _difference(arr1, arr2):
+    """
+    Signed difference arr1 - arr2 in a single pass
+
+    int32 for integer images (exact for uint8/uint16), float32 otherwise,
+    instead of upcasting both inputs to float64 first.
+    """
+    if np.issubdtype(arr1.dtype, np.integer) and np.issubdtype(arr2.dtype, np.integer):
+        dtype = np.int32
+    else:
+        dtype = np.float32
+    return np.subtract(arr1, arr2, dtype=dtype)
+
+
+def _accumulator_dtype(diff):
+    """Wide accumulator for reductions over a difference array"""
+    return np.int64 if np.issubdtype(diff.dtype, np.integer) else np.float64
+
+
+def _mean_squared_difference(arr1, arr2):
+    """
+    Mean of (arr1 - arr2) ** 2
+
+    einsum fuses the square and the sum into one pass, so no squared
+    temporary array is allocated.
+    """
+    diff = _difference(arr1, arr2).ravel()
+    sq_sum = np.einsum('i,i->', diff, diff, dtype=_accumulator_dtype(diff))
+    return float(sq_sum) / diff.size
+
+
+def _to_metric_tensor(img, slot=0):
+    """
+    Convert an image to a (1, C, H, W) float tensor in [0, 1] for pyiqa
+
+    The result is written into a float buffer that is kept per thread and
+    slot (grown to the largest image seen), laid out channels_last. On
+    CUDA the uint8 pixels are first copied into a reusable pinned buffer
+    and uploaded asynchronously (4x fewer bytes than float32); the float
+    conversion happens on the device.
+
+    The returned tensor is only valid until the next call with the same
+    slot on this thread.
+
+    Args:
+        img: numpy array, torch tensor, or PIL Image (H, W, C), 0-255
+        slot: Buffer to use; images that are in use at the same time need
+              different slots
+
+    Returns:
+        Tensor on _METRICS_DEVICE
+    """
+    # Already uint8 in the common case (PIL / OpenCV images): no cast copy
+    img_np = _to_numpy(img)
+    if img_np.dtype != np.uint8:
+        img_np = img_np.astype(np.uint8)
+    numel = img_np.size
+    height, width, channels = img_np.shape
+
+    # (1, H, W, C) storage viewed as (1, C, H, W): channels_last, no permute copy
+    output = _staging_buffer(('float', slot), numel, torch.float32, _METRICS_DEVICE)
+    output = output[:numel].view(1, height, width, channels)
+
+    if _METRICS_DEVICE == 'cuda':
+        pinned = _staging_buffer(('pinned', slot), numel, torch.uint8, 'cpu')
+        staged = pinned[:numel].view(img_np.shape)
+        np.copyto(staged.numpy(), img_np)
+        output.copy_(staged.to(_METRICS_DEVICE, non_blocking=True).unsqueeze(0))
+        output.div_(255.0)
+    else:
+        # uint8 -> float32 in [0, 1] in a single pass straight into the buffer
+        np.divide(img_np, 255.0, out=output.numpy()[0], dtype=np.float32)
+
+    return output.permute(0, 3, 1, 2)
+
+
+def _staging_buffer(key, numel, dtype, device):
+    """This thread's reusable flat buffer for key, grown to at least numel"""
+    buffers = getattr(_staging, 'buffers', None)
+    if buffers is None:
+        buffers = _staging.buffers = {}
+
+    buffer = buffers.get(key)
+    if buffer is None or buffer.numel() < numel:
+        # Allocated as a normal tensor even inside inference_mode, so it can
+        # still be written to by later calls made outside of it
+        with torch.inference_mode(False):
+            buffer = torch.empty(numel, dtype=dtype, device=device)
+            if key[0] == 'pinned':
+                buffer = buffer.pin_memory()
+        buffers[key] = buffer
+    return buffer
+
+
 def _to_numpy(img):
     """
     Convert various image formats to numpy array
@@ -327,7 +667,8 @@ def _to_numpy(img):
     if isinstance(img, np.ndarray):
         return img
     elif isinstance(img, Image.Image):
-        return np.array(img)
+        # Read-only view; callers never modify it
+        return np.asarray(img)
     elif isinstance(img, torch.Tensor):
         # Handle torch tensors (C, H, W) or (B, C, H, W)
         if img.dim() == 4:
@@ -340,6 +681,26 @@ def _to_numpy(img):
         raise TypeError(f"Unsupported image type: {type(img)}")
 
 
+def _load_rgb(path):
+    """
+    Decode an image file to a uint8 RGB array
+
+    OpenCV decodes straight into a contiguous array; PIL is only used for
+    formats this OpenCV build cannot read. EXIF orientation is ignored,
+    as with PIL.
+    """
+    img = cv2.imread(path, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        with Image.open(path) as pil_img:
+            return np.asarray(pil_img.convert('RGB'))
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def _array_size(arr):
+    """(width, height) of an image array, matching PIL's Image.size"""
+    return (arr.shape[1], arr.shape[0])
+
+
 def compare_images(original_path, processed_path, reference_path=None):
     """
     Compare images and calculate quality metrics
@@ -353,26 +714,34 @@ def compare_images(original_path, processed_path, reference_path=None):
     Returns:
         Dictionary with comparison results
     """
-    # Load images
-    original_img = Image.open(original_path).convert('RGB')
-    processed_img = Image.open(processed_path).convert('RGB')
-
+    # Load images as RGB arrays (sizes reported as (width, height) like PIL)
     if reference_path:
-        reference_img = Image.open(reference_path).convert('RGB')
+        reference_arr = _load_rgb(reference_path)
+        # Only the size of the original is needed (read from the header)
+        with Image.open(original_path) as img:
+            original_size = img.size
     else:
-        reference_img = original_img
+        reference_arr = _load_rgb(original_path)
+        original_size = _array_size(reference_arr)
+
+    processed_arr = _load_rgb(processed_path)
 
     # Resize processed image to match reference if needed
-    if processed_img.size != reference_img.size:
-        print(f"Warning: Resizing processed image from {processed_img.size} to {reference_img.size}")
-        processed_img = processed_img.resize(reference_img.size, Image.LANCZOS)
+    reference_size = _array_size(reference_arr)
+    if _array_size(processed_arr) != reference_size:
+        print(f"Warning: Resizing processed image from {_array_size(processed_arr)} to {reference_size}")
+        shrinking = processed_arr.shape[1] > reference_arr.shape[1]
+        processed_arr = cv2.resize(
+            processed_arr, reference_size,
+            interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+        )
 
     # Calculate metrics
-    metrics = calculate_all_metrics(reference_img, processed_img)
+    metrics = calculate_all_metrics(reference_arr, processed_arr)
 
     return {
-        'original_size': original_img.size,
-        'processed_size': processed_img.size,
-        'reference_size': reference_img.size,
+        'original_size': original_size,
+        'processed_size': _array_size(processed_arr),
+        'reference_size': reference_size,
         'metrics': metrics
     }
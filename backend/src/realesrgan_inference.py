@@ -1,20 +1,213 @@
 import os
+import math
+import time
+import queue
+import contextlib
+import threading
+from collections import OrderedDict
+import cv2
 import numpy as np
 import torch
+import torch.nn.functional as F
 from PIL import Image
 from basicsr.archs.rrdbnet_arch import RRDBNet
 from realesrgan import RealESRGANer
 
-from .metrics import calculate_all_metrics
+from .inference import _BatchRequest, _cpu_supports_bf16
+from .metrics import calculate_reference_metrics
+
+# Optional: fused uint8 -> float input normalization (falls back to NumPy)
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _normalize_uint8(img, out):
+    """Write a uint8 image scaled to [0, 1] into the float32 array out, in one pass"""
+    if numba is not None:
+        _normalize_uint8_kernel(img, out)
+    else:
+        np.divide(img, 255.0, out=out, dtype=np.float32)
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _normalize_uint8_kernel(img, out):
+        """uint8 (H, W, C) -> float32 (H, W, C) in [0, 1], rows in parallel"""
+        height, width, channels = img.shape
+        scale = np.float32(1.0 / 255.0)
+        for y in numba.prange(height):
+            for x in range(width):
+                for c in range(channels):
+                    out[y, x, c] = img[y, x, c] * scale
+
+
+class _ChannelsLastRealESRGANer(RealESRGANer):
+    """
+    RealESRGANer that feeds the model channels_last (NHWC) input
+
+    The model runs channels_last; an NCHW input would be converted inside
+    every first convolution (and keep cuDNN off its NHWC tensor-core kernels).
+    """
+
+    def pre_process(self, img):
+        super().pre_process(img)
+        self.img = self.img.contiguous(memory_format=torch.channels_last)
+
+
+class _PooledRealESRGANer(_ChannelsLastRealESRGANer):
+    """
+    RealESRGANer that uploads inputs through reusable buffers (CUDA)
+
+    The normalized input is copied into a pinned host buffer and uploaded
+    asynchronously into a device buffer; both are grown on demand and
+    reused, so repeated requests skip per-call pinned / device allocations.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pinned_input = None
+        self._device_input = None
+        self._copy_done = None
+
+    def pre_process(self, img):
+        # img: float32 (H, W, C) RGB in [0, 1], prepared by enhance()
+        numel = img.size
+        if self._pinned_input is None or self._pinned_input.numel() < numel:
+            self._pinned_input = torch.empty(numel, dtype=torch.float32).pin_memory()
+            self._device_input = torch.empty(numel, dtype=torch.float32, device=self.device)
+            self._copy_done = torch.cuda.Event()
+        else:
+            # Previous asynchronous copy must finish before the pinned buffer is reused
+            self._copy_done.synchronize()
+
+        pinned = self._pinned_input[:numel].view(img.shape)
+        if img.dtype == np.uint8:
+            # RGB uint8 from RealESRGANInference._enhance_rgb: normalize
+            # while filling the buffer
+            _normalize_uint8(img, pinned.numpy())
+        else:
+            np.copyto(pinned.numpy(), img)
+        device_input = self._device_input[:numel].view(img.shape)
+        device_input.copy_(pinned, non_blocking=True)
+        self._copy_done.record()
+
+        # (1, C, H, W) view of the HWC buffer, i.e. channels_last like the model
+        self.img = device_input.permute(2, 0, 1).unsqueeze(0)
+        if self.half:
+            self.img = self.img.half()
+
+        # Padding as in RealESRGANer.pre_process
+        if self.pre_pad != 0:
+            self.img = F.pad(self.img, (0, self.pre_pad, 0, self.pre_pad), 'reflect')
+        if self.scale == 2:
+            self.mod_scale = 2
+        elif self.scale == 1:
+            self.mod_scale = 4
+        if self.mod_scale is not None:
+            self.mod_pad_h, self.mod_pad_w = 0, 0
+            _, _, h, w = self.img.size()
+            if h % self.mod_scale != 0:
+                self.mod_pad_h = self.mod_scale - h % self.mod_scale
+            if w % self.mod_scale != 0:
+                self.mod_pad_w = self.mod_scale - w % self.mod_scale
+            self.img = F.pad(self.img, (0, self.mod_pad_w, 0, self.mod_pad_h), 'reflect')
+
+        # No-op for the unpadded view; padding returns NCHW
+        self.img = self.img.contiguous(memory_format=torch.channels_last)
+
+
+class _CUDAGraphModel:
+    """
+    Callable stand-in for the RRDB model that replays CUDA graphs
+
+    The RRDBNet forward has no data-dependent control flow, so its forward
+    for a given input shape can be captured into a CUDA graph once; calls
+    with that shape then only copy the input into the static buffer and
+    replay the graph, skipping the Python and kernel-launch overhead. Any
+    other shape runs the wrapped model directly.
+
+    Graphs are only captured while capturing is set, i.e. during warmup
+    for the configured sizes, never from live traffic (a capture must not
+    overlap with other GPU work in the process). Each graph keeps its
+    memory pool (the peak activations of its shape) reserved for as long
+    as it exists, so only inputs of at most max_pixels pixels (batch
+    included) are captured, which is where launch overhead matters anyway.
+    """
+
+    def __init__(self, model, max_pixels=256 * 256):
+        self.model = model
+        self.max_pixels = max_pixels
+        self.capturing = False
+        self._graphs = {}  # key -> (graph, static_input, static_output)
+
+    def __call__(self, x):
+        key = (tuple(x.shape), x.stride(), x.dtype)
+        entry = self._graphs.get(key)
+        if entry is None:
+            if not self.capturing or x.numel() // x.shape[1] > self.max_pixels:
+                return self.model(x)
+            try:
+                entry = self._capture(x)
+            except Exception as e:
+                # Only this shape stays uncaptured
+                print(f"[Warning] CUDA graph capture failed for input {tuple(x.shape)}: {e}")
+                return self.model(x)
+            self._graphs[key] = entry
+
+        graph, static_input, static_output = entry
+        static_input.copy_(x, non_blocking=True)
+        graph.replay()
+        # The next replay overwrites static_output
+        return static_output.clone()
+
+    def _capture(self, x):
+        """Capture the forward for x's shape / layout into a CUDA graph"""
+        static_input = torch.empty_like(x)
+        static_input.copy_(x)
+
+        # Warm up on a side stream first (cuDNN autotuning, lazy
+        # initialization), as graph capture requires
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                self.model(static_input)
+        torch.cuda.current_stream().wait_stream(stream)
+
+        # thread_local: only this thread's unsafe CUDA calls invalidate the
+        # capture, not work other request threads do meanwhile
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, capture_error_mode='thread_local'):
+            static_output = self.model(static_input)
+        return graph, static_input, static_output
 
 
 class RealESRGANInference:
     """Real-ESRGAN inference wrapper for super-resolution"""
 
-    def __init__(self, model_path, scale=4, device='cpu'):
+    def __init__(self, model_path, scale=4, device='cpu', dtype='fp16', tile=0, tile_pad=10,
+                 compile_model=True, max_batch=1, batch_timeout=0.008, cuda_graphs=True,
+                 warmup_sizes=(64,)):
+        if dtype not in ('fp32', 'fp16', 'bf16'):
+            raise ValueError(f"Unknown dtype: {dtype}")
+
         self.device = torch.device(device)
         self.scale = scale
         self.face_enhancer = None
+        self._input_buffer = None
+        self._output_buffer = None
+
+        if self.device.type == 'cuda':
+            # Let fp32 convolutions / matmuls use TF32 tensor cores (Ampere+)
+            torch.set_float32_matmul_precision('high')
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cudnn.benchmark = True
+        # RealESRGANer keeps per-call state on the instance, so concurrent
+        # request threads must not enter it at the same time
+        self._lock = threading.Lock()
 
         model = RRDBNet(
             num_in_ch=3, num_out_ch=3, num_feat=64,
@@ -24,19 +217,379 @@ class RealESRGANInference:
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model file not found: {model_path}")
 
-        self.upsampler = RealESRGANer(
+        if self.device.type == 'cuda':
+            upsampler_cls = _PooledRealESRGANer
+        else:
+            upsampler_cls = _ChannelsLastRealESRGANer
+        self.upsampler = upsampler_cls(
             scale=scale,
             model_path=model_path,
             model=model,
-            tile=0,
-            tile_pad=10,
+            tile=tile,
+            tile_pad=tile_pad,
             pre_pad=0,
-            half=(device == 'cuda'),
-            device=self.device
+            half=False,  # reduced precision comes from autocast (see below)
+            device=self.device,
         )
 
+        # NHWC activations for the RRDB backbone (faster convolutions with
+        # cuDNN tensor cores / oneDNN)
+        self.upsampler.model = self.upsampler.model.to(memory_format=torch.channels_last)
+
+        # Mixed precision through autocast rather than static fp16 weights:
+        # convolutions run on tensor cores (fp16 on CUDA, bf16 on CPUs with
+        # native support), ops that need fp32 stay in fp32, and
+        # RealESRGANer casts the output back to fp32
+        self._autocast_dtype = None
+        if self.device.type == 'cuda' and dtype == 'fp16':
+            self._autocast_dtype = torch.float16
+        elif self.device.type == 'cpu' and dtype == 'bf16' and _cpu_supports_bf16():
+            self._autocast_dtype = torch.bfloat16
+
+        # Dynamic batching: concurrent untiled requests are queued and a
+        # single worker thread runs same-sized inputs through the model as
+        # one batch (bypassing RealESRGANer.enhance, see _batch_worker).
+        # Set up first, as compilation and warmup take the request path
+        self.max_batch = max_batch
+        self.batch_timeout = batch_timeout
+        self._batch_queue = None
+        self._batch_closed = False
+        self._batch_queue_lock = threading.Lock()
+        if max_batch > 1 and not tile and scale not in (1, 2):
+            self._batch_queue = queue.Queue()
+            if self.device.type == 'cuda':
+                self._copy_stream = torch.cuda.Stream()
+                self._upload_buffers = [None, None]
+            threading.Thread(target=self._batch_worker, daemon=True).start()
+
+        if compile_model:
+            self._compile_model()
+
+        # Warmup sizes replay a captured CUDA graph (see _CUDAGraphModel)
+        if self.device.type == 'cuda' and cuda_graphs:
+            self.upsampler.model = _CUDAGraphModel(self.upsampler.model)
+
+        self._warmup(warmup_sizes)
+
         print(f"Real-ESRGAN model loaded successfully on {device}")
 
+    def _compile_model(self):
+        """
+        Compile the RRDB backbone with torch.compile (PyTorch 2.0+, CUDA only)
+
+        Fuses the many small elementwise ops of the residual dense blocks.
+        Compiled with dynamic shapes, since every upload has a different
+        size (the CUDA-graph 'reduce-overhead' mode would re-capture per
+        shape). Compilation is triggered here by one dummy inference
+        through the request path (see _infer_dummy), which feeds the model
+        exactly like a request does (dtype, layout and strides, grad mode
+        and autocast), so the first request does not pay for it. On failure
+        the eager model is kept. Skipped on CPU, where the Inductor compile
+        takes long and the time is dominated by the convolutions anyway.
+        """
+        if not hasattr(torch, 'compile') or self.device.type != 'cuda':
+            return
+
+        eager = self.upsampler.model
+        try:
+            self.upsampler.model = torch.compile(eager, dynamic=True)
+            self._infer_dummy(np.zeros((64, 64, 3), dtype=np.uint8))
+        except Exception as e:
+            self.upsampler.model = eager
+            print(f"[Warning] torch.compile failed, using eager Real-ESRGAN model: {e}")
+
+    def _warmup(self, sizes):
+        """
+        Run dummy square images of the given sizes through the model
+
+        Moves CUDA context setup, cuDNN algorithm search (per input shape)
+        and lazy allocations from the first request to startup. With CUDA
+        graphs, these sizes are also the ones captured (see _CUDAGraphModel).
+        """
+        graphed = isinstance(self.upsampler.model, _CUDAGraphModel)
+        if graphed:
+            self.upsampler.model.capturing = True
+        try:
+            for size in sizes:
+                self._infer_dummy(np.zeros((size, size, 3), dtype=np.uint8))
+        except Exception as e:
+            print(f"[Warning] Real-ESRGAN warmup failed: {e}")
+        finally:
+            if graphed:
+                self.upsampler.model.capturing = False
+
+    def _infer_dummy(self, img_rgb):
+        """
+        Upscale img_rgb the way infer_from_array handles a request: through
+        the batch worker when batching is enabled (whose batched input has
+        different strides than a single staged image), else directly
+        """
+        if self._batch_queue is not None:
+            return self._run_batched(img_rgb)
+        with self._lock:
+            return self._upscale(img_rgb)
+
+    def _autocast(self):
+        """Autocast context for the configured reduced precision (if any)"""
+        if self._autocast_dtype is None:
+            return contextlib.nullcontext()
+        # No weight-cast cache: each weight is used once per forward anyway,
+        # and cached casts must not outlive a CUDA graph capture
+        return torch.autocast(
+            device_type=self.device.type, dtype=self._autocast_dtype, cache_enabled=False
+        )
+
+    @torch.inference_mode()
+    def _enhance(self, img_bgr):
+        """Run RealESRGANer.enhance on a BGR array under the autocast context"""
+        with self._autocast():
+            output_bgr, _ = self.upsampler.enhance(img_bgr, outscale=self.scale)
+        return output_bgr
+
+    def _upscale(self, img_rgb):
+        """
+        Upscale an RGB uint8 array (without face enhancement), returns RGB
+
+        3-channel uint8 inputs at scale 4 go through _enhance_rgb; anything
+        else through RealESRGANer.enhance, which works on BGR.
+        """
+        if self._fused_input(img_rgb):
+            return self._enhance_rgb(img_rgb)
+
+        # Single SIMD pass (instead of a strided reverse + copy)
+        img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
+        output_bgr = self._enhance(img_bgr)
+        # The output array is ours, so swap it back in place rather than
+        # allocating another (4x upscaled) image
+        return cv2.cvtColor(output_bgr, cv2.COLOR_BGR2RGB, dst=output_bgr)
+
+    def _fused_input(self, img_rgb):
+        """Whether img_rgb can bypass RealESRGANer.enhance (see _enhance_rgb)"""
+        return img_rgb.ndim == 3 and img_rgb.shape[2] == 3 and img_rgb.dtype == np.uint8 \
+            and self.scale not in (1, 2)
+
+    @torch.inference_mode()
+    def _enhance_rgb(self, img_rgb):
+        """
+        RealESRGANer.enhance for RGB uint8 input, without its extra passes
+
+        enhance() takes BGR and converts, normalizes and swaps channels in
+        separate passes over the image (and back again on the output).
+        Here the uint8 input is normalized into a reusable float buffer in
+        a single pass (see _normalize_uint8) and handed to the upsampler as
+        a channels_last (1, C, H, W) view; the output is quantized on the
+        device and comes back as RGB. Only valid without pre / mod padding,
+        i.e. pre_pad=0 and scale 4.
+        """
+        return self._forward_rgb(img_rgb).cpu().numpy()
+
+    @torch.inference_mode()
+    def _forward_rgb(self, img_rgb):
+        """_enhance_rgb up to the output, as a uint8 (H, W, C) tensor on the model device"""
+        upsampler = self.upsampler
+        if isinstance(upsampler, _PooledRealESRGANer):
+            upsampler.pre_process(img_rgb)
+        else:
+            numel = img_rgb.size
+            if self._input_buffer is None or self._input_buffer.numel() < numel:
+                self._input_buffer = torch.empty(numel, dtype=torch.float32)
+            buffer = self._input_buffer[:numel].view(img_rgb.shape)
+            _normalize_uint8(img_rgb, buffer.numpy())
+            upsampler.img = buffer.permute(2, 0, 1).unsqueeze(0)
+
+        with self._autocast():
+            if upsampler.tile_size > 0:
+                upsampler.tile_process()
+            else:
+                upsampler.process()
+
+        output = upsampler.output.float().clamp_(0, 1).mul_(255.0).round_().to(torch.uint8)
+        return output.squeeze(0).permute(1, 2, 0).contiguous()
+
+    @torch.inference_mode()
+    def _infer_pil(self, img_rgb, face_enhance):
+        """
+        infer_from_array without metrics, straight to a PIL Image
+
+        The PIL Image owns a copy of the pixels anyway, so it is built
+        directly from what the model path produces: the device output via
+        a reusable pinned buffer (no per-call host array), and the BGR face
+        enhancer output through PIL's BGR raw mode (no channel swap pass).
+        """
+        if face_enhance:
+            output_bgr = self._enhance_faces(img_rgb)
+            height, width = output_bgr.shape[:2]
+            return Image.frombytes('RGB', (width, height), np.ascontiguousarray(output_bgr), 'raw', 'BGR')
+
+        if self._batch_queue is not None or not self._fused_input(img_rgb):
+            return Image.fromarray(self.infer_from_array(img_rgb))
+
+        with self._lock:
+            output = self._forward_rgb(img_rgb)
+            height, width = output.shape[:2]
+            if output.is_cuda:
+                numel = output.numel()
+                if self._output_buffer is None or self._output_buffer.numel() < numel:
+                    with torch.inference_mode(False):
+                        self._output_buffer = torch.empty(numel, dtype=torch.uint8).pin_memory()
+                pinned = self._output_buffer[:numel].view(output.shape)
+                pinned.copy_(output)
+                output = pinned
+            return Image.frombytes('RGB', (width, height), output.numpy())
+
+    def _enhance_faces(self, img_rgb):
+        """Run the GFPGAN face enhancer on an RGB array, returns BGR (as GFPGAN works on BGR)"""
+        img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
+        with self._lock:
+            self._init_face_enhancer()
+            with self._autocast():
+                _, _, output_bgr = self.face_enhancer.enhance(
+                    img_bgr, has_aligned=False, only_center_face=False, paste_back=True
+                )
+        return output_bgr
+
+    def _run_batched(self, img_rgb):
+        """Upscale an RGB uint8 array through the batch worker (directly once closed)"""
+        request = _BatchRequest(img_rgb)
+        with self._batch_queue_lock:
+            batched = not self._batch_closed
+            if batched:
+                self._batch_queue.put(request)
+        if not batched:
+            with self._lock:
+                return self._upscale(img_rgb)
+
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.output
+
+    def close(self):
+        """
+        Stop the batch worker (e.g. when the instance is evicted from the
+        model cache), so the thread no longer keeps the instance alive
+
+        Requests already queued are still processed; later calls run
+        directly under the lock.
+        """
+        with self._batch_queue_lock:
+            if self._batch_queue is None or self._batch_closed:
+                return
+            self._batch_closed = True
+            # Sentinel, queued after every pending request
+            self._batch_queue.put(None)
+
+    def _batch_worker(self):
+        """
+        Collect queued requests for up to batch_timeout seconds (at most
+        max_batch of them) and run inputs of the same shape as one batch
+
+        Only used without tiling and for scales that need no mod padding,
+        where RealESRGANer.enhance reduces to normalize -> model -> clamp
+        and round; this does the same on the whole batch at once. Exits
+        after the close() sentinel.
+        """
+        stop = False
+        while not stop:
+            request = self._batch_queue.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = time.monotonic() + self.batch_timeout
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._batch_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            # Only exact shape matches are stacked (no padding artifacts)
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.input.shape, []).append(request)
+
+            # The upload of the next group overlaps the forward of the
+            # current one (double-buffered, see _stage_batch)
+            groups = list(groups.values())
+            staged = self._stage_batch(groups[0], slot=0)
+            for index, requests in enumerate(groups):
+                try:
+                    if isinstance(staged, Exception):
+                        raise staged
+                    batch_input, uploaded = staged
+
+                    # Grad mode and autocast are per thread, so set them here
+                    with self._lock, torch.inference_mode(), self._autocast():
+                        if uploaded is not None:
+                            torch.cuda.current_stream().wait_event(uploaded)
+                        # (N, H, W, C) -> (N, C, H, W) view, channels_last like the model
+                        batch_input = batch_input.permute(0, 3, 1, 2).float().div_(255.0)
+                        output = self.upsampler.model(batch_input)
+                        if index + 1 < len(groups):
+                            # Forward is queued on the GPU, start the next upload
+                            staged = self._stage_batch(groups[index + 1], slot=(index + 1) % 2)
+                        output = output.float().clamp_(0, 1).mul_(255.0).round_().to(torch.uint8)
+                        output = output.permute(0, 2, 3, 1).contiguous().cpu().numpy()
+                    for request, request_output in zip(requests, output):
+                        request.output = request_output
+                except Exception as e:
+                    for request in requests:
+                        request.error = e
+                finally:
+                    for request in requests:
+                        request.done.set()
+
+    def _stage_batch(self, requests, slot):
+        """
+        Stack the inputs of a request group and start their upload
+
+        On CUDA the group is stacked into one of two pinned buffers (slot)
+        and copied on a separate stream, so the copy can run while the
+        other slot's batch is in the model. Buffers are grown on demand.
+
+        Returns:
+            (uint8 (N, H, W, C) tensor, CUDA event marking the end of the
+            upload or None), or the exception raised while staging
+        """
+        try:
+            shape = (len(requests),) + requests[0].input.shape
+            if self.device.type != 'cuda':
+                pixels = np.stack([request.input for request in requests])
+                return torch.from_numpy(pixels), None
+
+            numel = math.prod(shape)
+            buffers = self._upload_buffers[slot]
+            if buffers is None or buffers[0].numel() < numel:
+                # Staging happens both inside and outside inference mode
+                # (see _batch_worker); normal tensors can be written in either
+                with torch.inference_mode(False):
+                    buffers = (
+                        torch.empty(numel, dtype=torch.uint8).pin_memory(),
+                        torch.empty(numel, dtype=torch.uint8, device=self.device),
+                        torch.cuda.Event(),
+                    )
+                self._upload_buffers[slot] = buffers
+            else:
+                # The previous copy out of this pinned buffer must be done
+                buffers[2].synchronize()
+            pinned, device_buffer, uploaded = buffers
+
+            pinned = pinned[:numel].view(shape)
+            np.stack([request.input for request in requests], out=pinned.numpy())
+            device_input = device_buffer[:numel].view(shape)
+            with torch.cuda.stream(self._copy_stream):
+                device_input.copy_(pinned, non_blocking=True)
+                uploaded.record()
+            return device_input, uploaded
+        except Exception as e:
+            return e
+
     def _init_face_enhancer(self):
         """Initialize GFPGAN face enhancer (lazy loading)"""
         if self.face_enhancer is None:
@@ -50,7 +603,7 @@ class RealESRGANInference:
             )
             print("GFPGAN face enhancer loaded successfully")
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def infer_from_pil(self, pil_image, face_enhance=False, calculate_metrics=False, reference_image=None):
         """
         Run inference on a PIL Image
@@ -66,51 +619,110 @@ class RealESRGANInference:
             If calculate_metrics is False: PIL Image of the processed result
             If calculate_metrics is True: tuple of (PIL Image, metrics dict)
         """
-        img_rgb = np.array(pil_image.convert('RGB'))
-        img_bgr = img_rgb[:, :, ::-1].copy()
+        if calculate_metrics and reference_image is None:
+            # Use input image as reference
+            reference_image = pil_image
 
-        if face_enhance:
-            self._init_face_enhancer()
-            _, _, output_bgr = self.face_enhancer.enhance(
-                img_bgr, has_aligned=False, only_center_face=False, paste_back=True
-            )
-        else:
-            output_bgr, _ = self.upsampler.enhance(img_bgr, outscale=self.scale)
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+
+        if not calculate_metrics:
+            return self._infer_pil(np.asarray(pil_image), face_enhance)
 
-        output_rgb = output_bgr[:, :, ::-1]
-        output_image = Image.fromarray(output_rgb)
+        result = self.infer_from_array(
+            np.asarray(pil_image),
+            face_enhance=face_enhance,
+            calculate_metrics=calculate_metrics,
+            reference_image=reference_image
+        )
+
+        output_rgb, metrics = result
+        return Image.fromarray(output_rgb), metrics
+
+    @torch.inference_mode()
+    def infer_from_array(self, img_rgb, face_enhance=False, calculate_metrics=False, reference_image=None):
+        """
+        Run inference on an RGB numpy array
+
+        Returns the result as an array as well, so the pipeline can hand it
+        to the next stage (EDSR) without a round-trip through PIL.
+
+        Args:
+            img_rgb: uint8 numpy array (H, W, 3) in RGB order
+            face_enhance: Whether to use GFPGAN face enhancement (default: False)
+            calculate_metrics: Whether to calculate quality metrics (default: False)
+            reference_image: Reference image for metrics (PIL Image or path).
+                           If None and calculate_metrics=True, uses input image
+
+        Returns:
+            If calculate_metrics is False: uint8 RGB numpy array of the result
+            If calculate_metrics is True: tuple of (numpy array, metrics dict)
+        """
+        if self._batch_queue is not None and not face_enhance and self._fused_input(img_rgb):
+            # Batched path works on 3-channel uint8 RGB directly
+            output_rgb = self._run_batched(img_rgb)
+        elif face_enhance:
+            output_bgr = self._enhance_faces(img_rgb)
+            output_rgb = cv2.cvtColor(output_bgr, cv2.COLOR_BGR2RGB, dst=output_bgr)
+        else:
+            with self._lock:
+                output_rgb = self._upscale(img_rgb)
 
         # Calculate metrics if requested
         if calculate_metrics:
-            # Determine reference image
+            # Use input image as reference by default
             if reference_image is None:
-                # Use input image as reference
-                ref_img = pil_image.convert('RGB')
-            elif isinstance(reference_image, str):
-                # Load from path
-                ref_img = Image.open(reference_image).convert('RGB')
-            else:
-                # Assume it's already a PIL Image
-                ref_img = reference_image.convert('RGB')
+                reference_image = img_rgb
+            metrics = calculate_reference_metrics(output_rgb, reference_image)
+            return output_rgb, metrics
 
-            # Resize output to match reference for fair comparison
-            if output_image.size != ref_img.size:
-                output_resized = output_image.resize(ref_img.size, Image.LANCZOS)
-            else:
-                output_resized = output_image
+        return output_rgb
+
+
+# Loaded models keyed by configuration, least recently used first
+_MODEL_CACHE_SIZE = 4
+_model_cache = OrderedDict()
+_model_cache_lock = threading.Lock()
+# Per-configuration locks held while an instance is being built
+_model_build_locks = {}
 
-            # Calculate metrics
-            metrics = calculate_all_metrics(ref_img, output_resized)
-            return output_image, metrics
+def get_realesrgan_model(model_path='models/RealESRGAN_x4plus.pth', scale=4, device='cpu', dtype='fp16', tile=0,
+                         max_batch=1):
+    """
+    Get or create a Real-ESRGAN model instance for the given configuration
 
-        return output_image
+    Instances are cached per (model_path, scale, device, dtype, tile, max_batch),
+    like get_model for EDSR, so a different model path or scale never
+    returns the wrong model and repeated calls do not rebuild the RRDBNet.
+    Building an instance (weights, compilation, warmup) only holds a lock
+    for its own configuration, so lookups of other models are not blocked
+    meanwhile, and concurrent first calls still build it only once.
+    """
+    key = (os.path.abspath(model_path), scale, str(device), dtype, tile, max_batch)
+    with _model_cache_lock:
+        if key in _model_cache:
+            _model_cache.move_to_end(key)
+            return _model_cache[key]
+        build_lock = _model_build_locks.setdefault(key, threading.Lock())
 
+    with build_lock:
+        with _model_cache_lock:
+            if key in _model_cache:
+                _model_cache.move_to_end(key)
+                return _model_cache[key]
 
-_realesrgan_instance = None
+        evicted = None
+        try:
+            instance = RealESRGANInference(model_path, scale, device, dtype, tile, max_batch=max_batch)
+            with _model_cache_lock:
+                _model_cache[key] = instance
+                if len(_model_cache) > _MODEL_CACHE_SIZE:
+                    evicted = _model_cache.popitem(last=False)[1]
+        finally:
+            with _model_cache_lock:
+                _model_build_locks.pop(key, None)
 
-def get_realesrgan_model(model_path='models/RealESRGAN_x4plus.pth', scale=4, device='cpu'):
-    """Get or create Real-ESRGAN model instance (singleton pattern)"""
-    global _realesrgan_instance
-    if _realesrgan_instance is None:
-        _realesrgan_instance = RealESRGANInference(model_path, scale, device)
-    return _realesrgan_instance
+    if evicted is not None:
+        # Its batch worker would otherwise keep it alive
+        evicted.close()
+    return instance
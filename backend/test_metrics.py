@@ -6,8 +6,11 @@ to evaluate super-resolution results.
 """
 
 import os
+import numpy as np
+import torch
 from PIL import Image
 from src.metrics import calculate_all_metrics, calculate_psnr, calculate_ssim
+from src.metrics import _prepare_tensor_pair, _psnr_tensor, _ssim_tensor
 
 
 def test_basic_metrics():
@@ -37,6 +40,41 @@ def test_basic_metrics():
     print(f"   MAE:  {metrics['mae']:.2f}")
 
 
+def test_tensor_metrics_match_skimage():
+    """Check the tensor PSNR/SSIM used by calculate_all_metrics against scikit-image"""
+    from skimage.metrics import peak_signal_noise_ratio, structural_similarity
+
+    print("\n" + "=" * 60)
+    print("Tensor PSNR/SSIM vs scikit-image")
+    print("=" * 60)
+
+    # float32 tensors vs float64 scikit-image
+    psnr_tol = 1e-3  # dB
+    ssim_tol = 1e-4
+
+    for seed, shape in [(0, (64, 64, 3)), (1, (48, 80, 3)), (2, (97, 61, 3))]:
+        rng = np.random.default_rng(seed)
+        img1 = rng.integers(0, 256, shape, dtype=np.uint8)
+        # Correlated pair, so SSIM is not just noise around 0
+        noise = rng.normal(0, 20, shape)
+        img2 = np.clip(img1 + noise, 0, 255).astype(np.uint8)
+
+        with torch.inference_mode():
+            t1, t2 = _prepare_tensor_pair(img1, img2)
+            psnr = _psnr_tensor(t1, t2)
+            ssim = _ssim_tensor(t1, t2)
+
+        ref_psnr = peak_signal_noise_ratio(img1, img2, data_range=255)
+        ref_ssim = structural_similarity(
+            img1, img2, data_range=255, win_size=11, channel_axis=-1
+        )
+
+        print(f"   {shape}: PSNR {psnr:.4f} / {ref_psnr:.4f} dB, "
+              f"SSIM {ssim:.6f} / {ref_ssim:.6f}")
+        assert abs(psnr - ref_psnr) < psnr_tol, (psnr, ref_psnr)
+        assert abs(ssim - ref_ssim) < ssim_tol, (ssim, ref_ssim)
+
+
 def test_model_with_metrics():
     """Test model inference with metrics calculation"""
     print("\n" + "=" * 60)
@@ -168,6 +206,9 @@ if __name__ == '__main__':
     # Test 1: Basic metrics
     test_basic_metrics()
 
+    # Test 1b: Tensor PSNR/SSIM against scikit-image
+    test_tensor_metrics_match_skimage()
+
     # Test 2: Model with metrics
     test_model_with_metrics()
 
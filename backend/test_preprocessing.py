@@ -5,6 +5,7 @@ Tests preprocessing effects on images in testimage folder
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -13,7 +14,6 @@ sys.path.insert(0, src_dir)
 
 from preprocessing import preprocess_pipeline_custom
 from PIL import Image
-import matplotlib.pyplot as plt
 
 
 def process_testimage_folder():
@@ -26,14 +26,13 @@ def process_testimage_folder():
         print(f"Error: testimage folder not found")
         return
 
-    # Find all images
-    image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
-    image_files = []
-    for ext in image_extensions:
-        image_files.extend(testimage_dir.glob(ext))
-
-    # Remove duplicates
-    image_files = list(set(image_files))
+    # Find all images (one directory pass, extensions matched case-insensitively)
+    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp')
+    with os.scandir(testimage_dir) as entries:
+        image_files = sorted(
+            Path(entry.path) for entry in entries
+            if entry.is_file() and entry.name.lower().endswith(image_extensions)
+        )
 
     if not image_files:
         print(f"\nNo images found in testimage folder")
@@ -44,38 +43,20 @@ def process_testimage_folder():
     print(f"Found {len(image_files)} image(s)")
     print("=" * 60)
 
-    # Process each image
-    all_results = []
-
-    for idx, img_path in enumerate(image_files, 1):
-        print(f"\n[{idx}/{len(image_files)}] Processing: {img_path.name}")
-
-        try:
-            original = Image.open(img_path)
-
-            # Lightweight preprocessing: subtle contrast enhancement
-            result = preprocess_pipeline_custom(
-                str(img_path),
-                None,
-                remove_artifacts=False,
-                enhance_contrast=True,
-                contrast_method='clahe',
-                contrast_clip=1.5,  # Reduced from 2.0 for more natural effect
-                denoise=False,
-                gamma=None
-            )
-
-            all_results.append({
-                'name': img_path.name,
-                'original': original,
-                'processed': result
-            })
-
-            print(f"   Done")
-
-        except Exception as e:
-            print(f"   Error: {e}")
-            continue
+    # Process images concurrently (OpenCV releases the GIL), keep the
+    # results in file order
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {executor.submit(process_image, img_path): img_path for img_path in image_files}
+        processed = {}
+        for idx, future in enumerate(as_completed(futures), 1):
+            img_path = futures[future]
+            try:
+                processed[img_path] = future.result()
+                print(f"\n[{idx}/{len(image_files)}] Done: {img_path.name}")
+            except Exception as e:
+                print(f"\n[{idx}/{len(image_files)}] Error: {img_path.name}: {e}")
+
+    all_results = [processed[img_path] for img_path in image_files if img_path in processed]
 
     if not all_results:
         print("\nNo images processed")
@@ -85,11 +66,62 @@ def process_testimage_folder():
     print("Showing comparison...")
     print("=" * 60)
 
-    show_comparison(all_results)
+    if '--interactive' in sys.argv:
+        show_comparison(all_results)
+    else:
+        save_comparison(all_results, Path(current_dir) / 'comparison.png')
+
+
+def process_image(img_path):
+    """Load one image and run the lightweight preprocessing on it"""
+    original = Image.open(img_path)
+    original.load()  # Decode in the worker thread too
+
+    # Lightweight preprocessing: subtle contrast enhancement
+    result = preprocess_pipeline_custom(
+        str(img_path),
+        None,
+        remove_artifacts=False,
+        enhance_contrast=True,
+        contrast_method='clahe',
+        contrast_clip=1.5,  # Reduced from 2.0 for more natural effect
+        denoise=False,
+        gamma=None
+    )
+
+    return {
+        'name': img_path.name,
+        'original': original,
+        'processed': result
+    }
+
+
+def save_comparison(results, output_path):
+    """
+    Save before/after comparison as one image (no matplotlib, no window)
+
+    One row per result: original on the left, preprocessed on the right.
+    """
+    rows = [(result['original'].convert('RGB'), result['processed']) for result in results]
+    width = max(original.width + processed.width for original, processed in rows)
+    height = sum(max(original.height, processed.height) for original, processed in rows)
+
+    composite = Image.new('RGB', (width, height))
+    y = 0
+    for original, processed in rows:
+        composite.paste(original, (0, y))
+        composite.paste(processed, (original.width, y))
+        y += max(original.height, processed.height)
+
+    composite.save(output_path)
+    print(f"\nComparison saved to {output_path}")
+    print("Run with --interactive to show it in a window instead")
 
 
 def show_comparison(results):
     """Show before/after comparison"""
+    import matplotlib.pyplot as plt
+
     num_images = len(results)
 
     # 2 columns: Original, Preprocessed